@@ -5,6 +5,7 @@ class Player:
     epsilon = 0.00001 #decimal limitation
     ub = 1023.0 #upper bound
     lb = -1023.0 #lower bound
+    NUM_OF_TURNS = 10 #number of turns
     result = {}
     count = -1
 
@@ -40,7 +41,7 @@ class Player:
             return lst3
             # play 1023.0 for each column at first round
 
-        elif 2 <= self.count <= 18:
+        elif 2 <= self.count <= 2*self.NUM_OF_TURNS - 2:
             for key in self.data_keys:
                 if 0 <= sum(self.data[key]) <= self.ub:
                     # if the sum of that choose column is in between(0,1023.0)
@@ -154,7 +155,7 @@ class Player:
 
             return self.ub-((self.count+1)/2)*self.epsilon
 
-        elif 8 <= self.count <= 18:
+        elif 8 <= self.count <= 2*self.NUM_OF_TURNS - 2:
         #return{self.victory_col:self.ub-((self.count+1)/2)*self.epsilon
 
             return self.ub-((self.count+1)/2)*self.epsilon
@@ -194,7 +195,7 @@ class Player:
         #it won't work here,since he miss -1022.99997
 
             return self.lb+((self.count+1)/2)*self.epsilon
-        elif 8 <= self.count <= 18:
+        elif 8 <= self.count <= 2*self.NUM_OF_TURNS - 2:
         #return{self.column_name[0]:self.ub-(self.count//2)*self.epsilon
 
             return self.lb+((self.count+1)/2)*self.epsilon
@@ -250,7 +251,7 @@ class Player:
         negtive number in this column.
         '''
 
-        if 1<=self.count<= 18:
+        if 1<=self.count<= 2*self.NUM_OF_TURNS - 2:
             return self.lb
         else:
             if sum(self.data[self.victory_col]) == 0.0:
@@ -0,0 +1,225 @@
+from result_cache import test_key, uses_randomness
+from send_utility import HOST, PORT, REPLY_PREFIX, source_hash
+import asyncio
+import json
+
+# the largest reply readuntil accepts, replies with game matrices exceed the 64 KiB default
+REPLY_LIMIT = 1 << 26
+
+
+async def send_async(js, host=HOST, port=PORT):
+    """Send the json string js to the server with EOM appended and wait for the \\n terminated reply.
+
+    :return: the reply parsed as JSON, without its prefix
+    """
+    (reader, writer) = await asyncio.open_connection(host, port, limit=REPLY_LIMIT)
+    try:
+        writer.write('{}EOM'.format(js).encode('utf-8'))
+        await writer.drain()
+        data = await reader.readuntil(b'\n')
+    finally:
+        await _close(writer)
+    return json.loads(str(memoryview(data)[REPLY_PREFIX:], 'utf-8'))
+
+
+async def register_sources(sources, host=HOST, port=PORT, send=send_async):
+    """Upload sources once with REG, so that commands can reference them by hash.
+
+    :return: dict of source -> hash of the sources the server registered; empty if it does not
+             support REG
+    """
+    hashes = {}
+    for source in set(sources):
+        key = source_hash(source)
+        try:
+            reply = await send(json.dumps({"cmd": "REG", "syn": 12, "hash": key, "data": source}), host, port)
+        except (OSError, EOFError, ValueError):
+            return {}
+        # a server without REG may answer anything, only a list ending with finished registered the source
+        if not isinstance(reply, list) or not reply or reply[-1] != 'finished':
+            return {}
+        hashes[source] = key
+    return hashes
+
+
+async def send_batch(js, host=HOST, port=PORT, timeout=None):
+    """Send a BATCH command and iterate over its replies as the server streams them.
+
+    :param timeout: seconds to wait for each reply before raising TimeoutError
+
+    :return: an async iterator over the replies parsed as JSON, ending with the reply that closes the
+             batch, or with the only reply of a server that refused the command
+    """
+    (reader, writer) = await asyncio.open_connection(host, port, limit=REPLY_LIMIT)
+    try:
+        writer.write('{}EOM'.format(js).encode('utf-8'))
+        await writer.drain()
+        while True:
+            data = await asyncio.wait_for(reader.readuntil(b'\n'), timeout)
+            parsed = json.loads(str(memoryview(data)[REPLY_PREFIX:], 'utf-8'))
+            yield parsed
+            if _cell_index(parsed) is None:
+                return
+    finally:
+        await _close(writer)
+
+
+async def run_test_grid(p1, p2, conditions1, conditions2, limit=16, host=HOST, port=PORT, on_reply=None,
+                        name='The Last Jedi', cache=None, samples=1, refresh=False, upload_once=False,
+                        batch=False, scheduler=None, ladder=None, modules=('p1', 'p2')):
+    """Run the TEST of every (vt1, vt2) pair for both seat orders concurrently.
+
+    With a cache, a TEST whose sources and conditions were tested before is answered from the cache
+    and only the missing replies are asked from the server. A TEST involving a randomized player
+    (see uses_randomness) is a sample of a distribution, so samples replies are kept for it.
+
+    With upload_once, p1 and p2 are registered once with REG and every TEST references them by
+    hash. A TEST whose hash the server reports missing is sent again with the sources inline, and
+    a server without REG gets every TEST inline.
+
+    With batch, all the games the grid needs go to the server as one BATCH command, whose replies
+    stream back as the games finish; a server without BATCH gets one TEST per game instead.
+
+    :param p1: source code of the tested player
+    :param p2: source code of the opponent
+    :param conditions1: victory conditions of the tested player
+    :param conditions2: victory conditions of the opponent
+    :param limit: the largest number of TEST commands in flight at once
+    :param on_reply: called as on_reply(seat, parsed) with each reply as it arrives, seat 0 when the
+                     tested player went first and 1 otherwise
+    :param cache: a ResultCache, or None
+    :param samples: number of replies of a TEST with a randomized player
+    :param refresh: ask the server again for every TEST, replacing the cached replies
+    :param upload_once: register the sources once and reference them by hash
+    :param batch: send the grid as one BATCH command
+    :param scheduler: a RequestScheduler sending the REG and TEST commands with deadlines, hedging and
+                      retries; the replies of a BATCH then each have its deadline
+    :param ladder: a RatingLadder that rates the game of every reply received from the server, or None;
+                   cached replies were rated when they were received
+    :param modules: the names of p1 and p2 on the ladder
+    :return: (first, second) result tables of the tested player going first and second, each
+             mapping (vt1, vt2) of the reply to its result, as main.py's result_table, or to the list of
+             results of the samples of a randomized TEST. A cell whose TEST got no reply has the result
+             'timeout' if it ran out of the scheduler's deadline and 'failed' if it raised otherwise
+    """
+    n = samples if uses_randomness(p1) or uses_randomness(p2) else 1
+    # the cells of the grid as (seat, vt1, vt2) with vt1 the condition of p1, and their cache keys
+    cells = [(seat, vt1, vt2) for vt1 in conditions1 for vt2 in conditions2 for seat in (0, 1)]
+    keys = [test_key(*_test_args(p1, p2, *cell), cell[0]) for cell in cells]
+    replies = [[] for _ in cells]
+    # cell index -> 'timeout' or 'failed' for the cells whose TEST raised
+    failures = {}
+
+    def received(i, parsed):
+        replies[i].append(parsed)
+        if cache is not None and parsed[-1] == 'finished':
+            cache.add(keys[i], parsed, n)
+        if ladder is not None and parsed[-1] == 'finished':
+            ladder.update_reply(modules if cells[i][0] == 0 else modules[::-1], parsed)
+        if on_reply is not None:
+            on_reply(cells[i][0], parsed)
+
+    needed = []
+    for (i, key) in enumerate(keys):
+        cached = []
+        if cache is not None:
+            if refresh:
+                cache.refresh(key)
+            cached = cache.get(key)[-n:]
+        for parsed in cached:
+            replies[i].append(parsed)
+            if on_reply is not None:
+                on_reply(cells[i][0], parsed)
+        needed += [i] * (n - len(cached))
+
+    send = scheduler.send if scheduler is not None else send_async
+    if needed:
+        hashes = await register_sources((p1, p2), host, port, send) if upload_once else {}
+        if batch:
+            timeout = scheduler.deadline if scheduler is not None else None
+            needed = await _run_batch(p1, p2, cells, needed, hashes, name, host, port, received, timeout)
+        semaphore = asyncio.Semaphore(limit)
+
+        async def ask(i):
+            async with semaphore:
+                args = _test_args(p1, p2, *cells[i])
+                parsed = await send(_command('TEST', hashes, name, *args), host, port)
+                if parsed[-1] == 'missing':
+                    parsed = await send(_command('TEST', {}, name, *args), host, port)
+            received(i, parsed)
+
+        # a TEST that fails only loses its own cell
+        for (i, outcome) in zip(needed, await asyncio.gather(*(ask(i) for i in needed), return_exceptions=True)):
+            if isinstance(outcome, (asyncio.TimeoutError, TimeoutError)):
+                failures[i] = 'timeout'
+            elif isinstance(outcome, Exception):
+                failures[i] = 'failed'
+            elif isinstance(outcome, BaseException):
+                raise outcome
+
+    tables = ({}, {})
+    for (i, ((seat, vt1, vt2), cell_replies)) in enumerate(zip(cells, replies)):
+        if not cell_replies:
+            tables[seat][(vt1, vt2) if seat == 0 else (vt2, vt1)] = failures.get(i, 'failed')
+            continue
+        parsed = cell_replies[-1]
+        results = [r[-2] for r in cell_replies]
+        tables[seat][(parsed[1][1], parsed[2][1])] = results[0] if n == 1 else results
+    return tables
+
+
+async def _run_batch(p1, p2, cells, needed, hashes, name, host, port, received, timeout):
+    # play the needed games as one BATCH, and return those a server without BATCH did not play
+    for inline in (False, True):
+        batch_cells = [[vt1, vt2, seat] for (seat, vt1, vt2) in (cells[i] for i in needed)]
+        js = _command('BATCH', {} if inline else hashes, name, p1, p2, cells=batch_cells)
+        answered = set()
+        last = None
+        try:
+            async for last in send_batch(js, host, port, timeout):
+                j = _cell_index(last)
+                if j is not None and j < len(needed):
+                    received(needed[j], last)
+                    answered.add(j)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError, TimeoutError):
+            pass
+        needed = [i for (j, i) in enumerate(needed) if j not in answered]
+        if not isinstance(last, list) or not last or last[-1] != 'missing':
+            break
+    return needed
+
+
+def _cell_index(reply):
+    # the replies of the cells of a BATCH carry the cell index next to syn, the reply closing it does not;
+    # a server without BATCH may answer anything else
+    if isinstance(reply, list) and reply and isinstance(reply[0], list) and len(reply[0]) > 2 \
+            and isinstance(reply[0][2], int):
+        return reply[0][2]
+    return None
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+
+
+def _test_args(p1, p2, seat, vt1, vt2):
+    # the sources and conditions of a TEST of the cell, first mover first
+    return (p1, p2, vt1, vt2) if seat == 0 else (p2, p1, vt2, vt1)
+
+
+def _command(cmd, hashes, name, data, data2, vt1=None, vt2=None, cells=None):
+    message = {"cmd": cmd, "syn": 12, "name": name}
+    for (field, hash_field, source) in (('data', 'hash', data), ('data2', 'hash2', data2)):
+        if source in hashes:
+            message[hash_field] = hashes[source]
+        else:
+            message[field] = source
+    if cells is not None:
+        message['cells'] = cells
+    else:
+        message.update(vt1=vt1, vt2=vt2)
+    return json.dumps(message)
@@ -0,0 +1,203 @@
+from collections import defaultdict as dd
+from referee import check_win_states, NUM_OF_TURNS, COLUMN_NAMES
+from win_tracker import WinStateTracker
+import numpy as np
+import time
+
+
+def new_player(player_cls):
+    """Create a player whose mutable class attributes are private to the instance.
+
+    The player classes keep their game state (played_data, enemy_col_cond, ...) in class level
+    dicts and lists, which would be shared by every game of a batch.
+
+    :param player_cls: the Player class of a player module
+    :return: a fresh Player instance
+    """
+    player = player_cls()
+    for (name, value) in _mutable_class_attributes(player_cls):
+        if isinstance(value, dd):
+            setattr(player, name, dd(value.default_factory))
+        else:
+            setattr(player, name, type(value)())
+    return player
+
+
+def _mutable_class_attributes(player_cls):
+    if player_cls not in _MUTABLE_ATTRIBUTES:
+        attributes = {}
+        for klass in reversed(player_cls.__mro__):
+            for (name, value) in vars(klass).items():
+                if isinstance(value, (dict, list, set)):
+                    attributes[name] = value
+        _MUTABLE_ATTRIBUTES[player_cls] = list(attributes.items())
+    return _MUTABLE_ATTRIBUTES[player_cls]
+
+
+_MUTABLE_ATTRIBUTES = {}
+
+
+class BatchEngine:
+    """Plays many games between two player classes at once.
+
+    All games are held in one preallocated array of shape (games, columns, 2*num_of_turns+1) and
+    are advanced turn by turn together. As in main_old.py, both players see the same board in a
+    turn and their rows are appended after both have played: player 1 fills the odd rows and
+    player 2 the even rows, with row 0 initialised to 0.
+
+    Players receive each game as main_old.py gives it, a dict of column name -> list of floats. The
+    board is the record of the games; those lists are copies of it, extended with the two rows of
+    each turn after both players have played, since the players rely on list semantics (membership,
+    slicing, concatenation) that array views of the board would change.
+
+    A player raising an exception in take_turn forfeits that game: it is not asked again, its
+    remaining rows are left at 0 and it cannot win.
+
+    Attributes:
+        board (np.ndarray): the game matrices, float64 of shape (games, columns, rows)
+        length (int): the number of rows played so far, shared by all games
+        players (list): (player1, player2) instances for each game
+        views (list): the dict of column name -> list of each game, as the players receive it
+        victories (list): ((condition1, column1), (condition2, column2)) for each game
+        forfeit (np.ndarray): bool of shape (games, 2), True if the player raised an exception
+        errors (dict): (game, seat) -> the exception a player raised
+        tracker (WinStateTracker): running column statistics, for checking the games mid-play
+        seeds (list): the seed of each game, or None
+    """
+
+    def __init__(self, player1_cls, player2_cls, victories, num_of_turns=NUM_OF_TURNS,
+                 column_names=COLUMN_NAMES, seeds=None):
+        """
+        :param player1_cls: Player class of the first player to move
+        :param player2_cls: Player class of the second player to move
+        :param victories: list of ((condition1, column1), (condition2, column2)), one per game
+        :param num_of_turns: number of turns per game
+        :param column_names: the column names of the board
+        :param seeds: one integer seed per game. Players with an rng attribute then draw from a
+                      np.random.RandomState seeded with [seed, seat], so that the game can be replayed
+        """
+        self.num_of_turns = num_of_turns
+        self.column_names = tuple(column_names)
+        self.victories = list(victories)
+        n = len(self.victories)
+
+        self.board = np.zeros((n, len(self.column_names), 2*num_of_turns+1))
+        self.length = 1
+        self.players = [(new_player(player1_cls), new_player(player2_cls)) for _ in range(n)]
+        for player in (p for pair in self.players for p in pair):
+            # players that know the length of a game read it from NUM_OF_TURNS
+            if hasattr(player, 'NUM_OF_TURNS'):
+                player.NUM_OF_TURNS = num_of_turns
+        self.seeds = None if seeds is None else [int(s) for s in seeds]
+        if self.seeds is not None:
+            for (seed, pair) in zip(self.seeds, self.players):
+                for (seat, player) in enumerate(pair):
+                    if hasattr(player, 'rng'):
+                        player.rng = np.random.RandomState([seed, seat])
+        self.views = [{c: [0.0] for c in self.column_names} for _ in range(n)]
+        self.forfeit = np.zeros((n, 2), dtype=bool)
+        self.errors = {}
+        self._forfeit_row = [0.0] * len(self.column_names)
+        self.tracker = WinStateTracker(n, len(self.column_names))
+        self.tracker.append(self.board[:, :, 0])
+
+    def __len__(self):
+        return len(self.victories)
+
+    def step(self):
+        """Play one turn of every game."""
+        if self.length >= self.board.shape[2]:
+            raise ValueError('all turns have been played')
+        row = self.length
+        turn_rows = []
+        for (g, view) in enumerate(self.views):
+            game_rows = []
+            for seat in (0, 1):
+                values = None
+                if (g, seat) not in self.errors:
+                    try:
+                        turn_data = self.players[g][seat].take_turn(view, self.victories[g][seat])
+                        values = [float(turn_data[c]) for c in self.column_names]
+                    except Exception as e:
+                        self.forfeit[g, seat] = True
+                        self.errors[(g, seat)] = e
+                game_rows.append(values or self._forfeit_row)
+            turn_rows.append(game_rows)
+
+        # rows are (game, seat, column); the board is (game, column, row)
+        self.board[:, :, row:row+2] = np.array(turn_rows).transpose(0, 2, 1)
+        self.tracker.extend(self.board[:, :, row:row+2])
+        self.length += 2
+        for (view, game_rows) in zip(self.views, turn_rows):
+            for (column, value1, value2) in zip(view.values(), *game_rows):
+                column.append(value1)
+                column.append(value2)
+
+    def play(self):
+        """Play all remaining turns of every game.
+
+        :return: the game results, see score
+        """
+        while self.length < self.board.shape[2]:
+            self.step()
+        return self.score()
+
+    def game_state(self, game):
+        """
+        :param game: the game index
+        :return: the game matrix as a dict of column name -> list of floats, like main_old.py
+        """
+        return {c: self.board[game, i, :self.length].tolist() for (i, c) in enumerate(self.column_names)}
+
+    def wins(self, live=False):
+        """
+        :param live: use the running statistics of the tracker instead of scoring the board,
+                     which is cheaper in the middle of a game
+        :return: bool array of shape (games, 2), True where a player met its victory condition
+        """
+        column_index = {c: i for (i, c) in enumerate(self.column_names)}
+        wins = np.zeros((len(self), 2), dtype=bool)
+        for seat in (0, 1):
+            conditions = [v[seat][0] for v in self.victories]
+            columns = [column_index[v[seat][1]] for v in self.victories]
+            if live:
+                wins[:, seat] = self.tracker.check_win_states(conditions, columns)
+            else:
+                wins[:, seat] = check_win_states(self.board[:, :, :self.length], conditions, columns)
+        return wins & ~self.forfeit
+
+    def score(self):
+        """
+        :return: int array with one result per game: 0 for a draw, 1 if player 1 won, 2 if player 2 won
+        """
+        wins = self.wins()
+        return np.where(wins[:, 0] == wins[:, 1], 0, np.where(wins[:, 0], 1, 2))
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+    from assign_stupid2_bkp import Player as Player
+    from player_minimal import Player as Player_Min
+
+    num_of_games = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    store = sys.argv[3] if len(sys.argv) > 3 else None
+    rnd = random.Random(seed)
+    victories = []
+    for _ in range(num_of_games):
+        (column1, column2) = rnd.sample(COLUMN_NAMES, 2)
+        victories.append((('Max', column1), ('Max', column2)))
+
+    start = time.time()
+    engine = BatchEngine(Player, Player_Min, victories, seeds=range(seed, seed + num_of_games))
+    results = engine.play()
+    elapsed = time.time() - start
+
+    counts = np.bincount(results, minlength=3)
+    print('{} games in {:.2f}s ({:.0f} games/s)'.format(num_of_games, elapsed, num_of_games / elapsed))
+    print('draw: {}\tplayer 1 won: {}\tplayer 2 won: {}'.format(*counts))
+    if store is not None:
+        from result_store import ResultStore
+        ResultStore(store).append_engine(engine, ('assign_stupid2_bkp', 'player_minimal'))
+    print('Simulation finished')
@@ -0,0 +1,109 @@
+from async_client import send_async
+from send_utility import HOST, PORT, source_hash
+import argparse
+import asyncio
+import json
+import os
+
+# the syn of a command whose manifest entry does not give one
+SYN = 12
+
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def plan(manifest, sources, deployed):
+    """Work out the commands that bring the server from the deployed state to the manifest.
+
+    :param manifest: {"players": {name: file}, "remove": [entry, ...]} where an entry of remove is a name,
+                     or {"name": name, "syn": syn} for a DEL that has to be sent with its own syn
+    :param sources: dict of file -> source of the files of the manifest
+    :param deployed: dict of name -> hash of the source deployed under it, or None for a name known
+                     to be deleted
+    :return: list of ('ADD', name, source, syn) and ('DEL', name, None, syn)
+    """
+    commands = []
+    players = manifest.get('players', {})
+    for (name, path) in sorted(players.items()):
+        if deployed.get(name) != source_hash(sources[path]):
+            commands.append(('ADD', name, sources[path], SYN))
+    syns = {n: SYN for (n, h) in deployed.items() if h is not None}
+    for entry in manifest.get('remove', []):
+        if isinstance(entry, dict):
+            syns[entry['name']] = entry.get('syn', SYN)
+        else:
+            syns[entry] = SYN
+    for name in sorted(set(syns) - set(players)):
+        if name not in deployed or deployed[name] is not None:
+            commands.append(('DEL', name, None, syns[name]))
+    return commands
+
+
+async def sync(commands, deployed, host=HOST, port=PORT, limit=8):
+    """Send the commands concurrently, updating deployed with every one the server accepted.
+
+    :return: list of (cmd, name, reply or the exception raised); a reply the server did not accept the
+             command with is returned as it is, without updating deployed
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def send(cmd, name, source, syn):
+        message = {"cmd": cmd, "syn": syn, "name": name, "data": source if source is not None else ""}
+        try:
+            async with semaphore:
+                reply = await send_async(json.dumps(message), host, port)
+        except (OSError, EOFError, ValueError) as e:
+            return (cmd, name, e)
+        # only a list not ending with error is an accepted command, anything else leaves the state as it was
+        if isinstance(reply, list) and reply and reply[-1] != 'error':
+            deployed[name] = source_hash(source) if cmd == 'ADD' else None
+        return (cmd, name, reply)
+
+    return await asyncio.gather(*(send(*c) for c in commands))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deploy the players of a manifest, sending only the ADD and DEL '
+                                                 'commands that changed since the last deployment.')
+    parser.add_argument('manifest', nargs='?', default='deploy_manifest.json',
+                        help='JSON {"players": {name: file}, "remove": [name or {"name": name, "syn": syn}, ...]}')
+    parser.add_argument('--state', default='.deploy_state.json', help='the deployed state of each server')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--limit', type=int, default=8, help='commands in flight at once')
+    parser.add_argument('--force', action='store_true', help='ignore the deployed state and send everything')
+    parser.add_argument('--dry-run', action='store_true', help='print the commands without sending them')
+    args = parser.parse_args()
+
+    manifest = load_json(args.manifest, None)
+    if manifest is None:
+        parser.error('no manifest {}'.format(args.manifest))
+    sources = {}
+    for path in set(manifest.get('players', {}).values()):
+        with open(os.path.join(os.path.dirname(os.path.abspath(args.manifest)), path), 'r') as f:
+            sources[path] = f.read()
+    state = load_json(args.state, {})
+    server = '{}:{}'.format(args.host, args.port)
+    deployed = state.get(server, {})
+    if args.force:
+        # an empty hash matches no source, so every player is added and every known name deleted again
+        deployed = {name: '' for name in deployed}
+
+    commands = plan(manifest, sources, deployed)
+    if args.dry_run:
+        for (cmd, name, _, _) in commands:
+            print('{}\t{}'.format(cmd, name))
+    else:
+        deployed = dict(deployed)
+        for (cmd, name, reply) in asyncio.run(sync(commands, deployed, args.host, args.port, args.limit)):
+            print('{}\t{}\t{}'.format(cmd, name, reply if isinstance(reply, Exception) else json.dumps(reply)))
+        state[server] = deployed
+        tmp = args.state + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(tmp, args.state)
+    print('{} commands'.format(len(commands)))
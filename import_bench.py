@@ -0,0 +1,65 @@
+from tournament import PLAYER_MODULES
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# the program of each child interpreter: import the preloaded modules, then time the import of the module
+_CHILD = '''
+import json, os, sys, time
+for name in sys.argv[2:]:
+    __import__(name)
+start = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - start
+try:
+    # ru_maxrss would count the parent's memory, which the child inherits as its high-water mark at fork
+    with open('/proc/self/statm') as f:
+        resident = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+except OSError:
+    resident = None
+print(json.dumps([elapsed, resident, 'scipy' in sys.modules]))
+'''
+
+
+def import_time(module, preload=(), repeat=5):
+    """Import a module in fresh interpreters and time the import.
+
+    :param module: name of the module, imported from the directory of this file
+    :param preload: modules imported before the timer starts, to leave out the cost of numpy, which
+                    a sandbox worker has loaded before it compiles a player
+    :param repeat: number of interpreters to take the median of
+    :return: (median seconds, resident size in MB after the import or None where it cannot be read,
+             whether scipy was loaded)
+    """
+    times = []
+    resident = None
+    scipy = False
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', _CHILD, module] + list(preload), check=True, capture_output=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), text=True).stdout
+        (elapsed, size, loaded) = json.loads(out)
+        times.append(elapsed)
+        if size is not None:
+            resident = max(resident or 0, size / (1 << 20))
+        scipy = scipy or loaded
+    return (statistics.median(times), resident, scipy)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure how long importing each player module takes.')
+    parser.add_argument('modules', nargs='*', default=PLAYER_MODULES, help='player module names')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module')
+    parser.add_argument('--preload', nargs='*', default=['numpy'],
+                        help='modules already loaded for the preloaded timing')
+    args = parser.parse_args()
+
+    print('module\tcold(ms)\tpreloaded(ms)\tresident(MB)\tscipy')
+    for m in args.modules:
+        (cold, resident, scipy) = import_time(m, repeat=args.repeat)
+        (warm, _, _) = import_time(m, args.preload, args.repeat)
+        print('{}\t{:.1f}\t{:.2f}\t{}\t{}'.format(m, cold * 1000, warm * 1000,
+                                                 '-' if resident is None else '{:.0f}'.format(resident),
+                                                 'yes' if scipy else 'no'))
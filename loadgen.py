@@ -0,0 +1,297 @@
+from async_client import send_async
+from referee import VICTORIES_CONDITIONS
+from send_utility import HOST, PORT
+from tournament import PLAYER_MODULES
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+PERCENTILES = (50, 90, 95, 99, 99.9, 100)
+
+
+class LatencyHistogram:
+    """A log-linear histogram of latencies, after the layout of HdrHistogram.
+
+    Values are recorded in microseconds. Values below 2**sub_bucket_bits fall in buckets of width 1;
+    above, every power of two is split into 2**(sub_bucket_bits-1) buckets, so a recorded value is
+    known to within a relative error of 2**(1-sub_bucket_bits), about 1.6% for the default, however
+    large it is. Recording and memory are independent of the number of values.
+    """
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = []
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds):
+        value = max(0, int(round(seconds * 1e6)))
+        i = self._index(value)
+        if i >= len(self.counts):
+            self.counts.extend([0] * (i + 1 - len(self.counts)))
+        self.counts[i] += 1
+        self.total += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for (i, c) in enumerate(other.counts):
+            self.counts[i] += c
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """
+        :param p: percentile between 0 and 100
+        :return: the latency in seconds below which p percent of the values fall, as the upper end of
+                 its bucket, capped at the largest value recorded
+        """
+        if self.total == 0:
+            return float('nan')
+        rank = self._rank(p)
+        seen = 0
+        for (i, c) in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self._upper(i), self.max) / 1e6
+        return self.max / 1e6
+
+    def distribution(self, steps=(50, 75, 90, 95, 99, 99.9, 99.99, 100)):
+        """
+        :return: list of (latency in seconds, percentile, count up to it, 1/(1-percentile)) rows, as in
+                 the percentile distribution output of HdrHistogram
+        """
+        rows = []
+        for p in steps:
+            value = self.percentile(p)
+            rows.append((value, p / 100, self._rank(p), float('inf') if p >= 100 else 1 / (1 - p / 100)))
+        return rows
+
+    def to_json(self):
+        return {'sub_bucket_bits': self.sub_bucket_bits, 'counts': self.counts, 'max': self.max}
+
+    @classmethod
+    def from_json(cls, data):
+        histogram = cls(data['sub_bucket_bits'])
+        histogram.counts = list(data['counts'])
+        histogram.total = sum(histogram.counts)
+        histogram.max = data['max']
+        return histogram
+
+    def _index(self, value):
+        half = 1 << (self.sub_bucket_bits - 1)
+        shift = max(0, value.bit_length() - self.sub_bucket_bits)
+        return shift * half + (value >> shift)
+
+    def _upper(self, index):
+        half = 1 << (self.sub_bucket_bits - 1)
+        shift = max(0, index // half - 1)
+        return ((index - shift * half + 1) << shift) - 1
+
+    def _rank(self, p):
+        # the number of values at or below percentile p, rounded up
+        return max(1, int(-(-p * self.total // 100)))
+
+
+def message_factory(sources, mix, rng):
+    """Make a function generating commands in the shapes main.py and add_delete_player.py send.
+
+    :param sources: the player sources TEST, ADD and DEL commands draw from
+    :param mix: dict of command -> weight
+    :param rng: a random.Random
+    :return: a function returning (cmd, json string) of the next command. A DEL deletes a player added
+             earlier in the run when there is one
+    """
+    added = []
+    names = itertools.count()
+    (commands, weights) = zip(*mix.items())
+
+    def make():
+        cmd = rng.choices(commands, weights)[0]
+        if cmd == 'TEST':
+            message = {"cmd": "TEST", "syn": 12, "name": "loadgen", "data": rng.choice(sources),
+                       "data2": rng.choice(sources), "vt1": rng.choice(VICTORIES_CONDITIONS),
+                       "vt2": rng.choice(VICTORIES_CONDITIONS)}
+        elif cmd == 'ADD':
+            added.append('loadgen {}'.format(next(names)))
+            message = {"cmd": "ADD", "syn": 12, "name": added[-1], "data": rng.choice(sources)}
+        else:
+            name = added.pop(rng.randrange(len(added))) if added else 'loadgen missing'
+            message = {"cmd": "DEL", "syn": 12, "name": name, "data": ""}
+        return (cmd, json.dumps(message))
+
+    return make
+
+
+async def run_load(make_message, host=HOST, port=PORT, concurrency=8, rate=None, duration=10.0, requests=None,
+                   timeout=30.0):
+    """Send commands to a server and measure their latencies.
+
+    With rate, commands start on a fixed schedule of rate per second whatever the server does, and
+    each latency is measured from the scheduled start, so a stalling server shows up in the tail
+    instead of slowing the schedule down. Otherwise concurrency clients each send a command as soon
+    as their previous one is answered.
+
+    A command not answered within timeout is given up: it counts as an error and as a timeout, and its
+    latency is recorded as the time it was given up after, so that one stalled reply cannot hold a
+    closed loop client forever.
+
+    :param make_message: a function returning (cmd, json string), see message_factory
+    :param duration: seconds to keep starting commands
+    :param requests: stop after this many commands instead, if given
+    :param timeout: seconds to wait for a reply
+    :return: dict of elapsed, and of cmd -> (LatencyHistogram, errors, timeouts) with the cmd 'all' for
+             every command
+    """
+    stats = {}
+    started = itertools.count()
+
+    def done(cmd, latency, ok, timed_out=False):
+        for key in (cmd, 'all'):
+            (histogram, counts) = stats.setdefault(key, (LatencyHistogram(), [0, 0]))
+            histogram.record(latency)
+            counts[0] += not ok
+            counts[1] += timed_out
+
+    async def one(cmd, js, start):
+        timed_out = False
+        try:
+            reply = await asyncio.wait_for(send_async(js, host, port), timeout)
+            # any reply other than a list not ending with error, such as a JSON object, is an error
+            ok = isinstance(reply, list) and bool(reply) and reply[-1] != 'error'
+        except asyncio.TimeoutError:
+            (ok, timed_out) = (False, True)
+        except (OSError, EOFError, ValueError, asyncio.LimitOverrunError):
+            ok = False
+        done(cmd, time.perf_counter() - start, ok, timed_out)
+
+    begin = time.perf_counter()
+
+    def more():
+        if requests is not None:
+            return next(started) < requests
+        return time.perf_counter() - begin < duration
+
+    if rate is None:
+        async def client():
+            while more():
+                (cmd, js) = make_message()
+                await one(cmd, js, time.perf_counter())
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+    else:
+        tasks = []
+        i = 0
+        while more():
+            scheduled = begin + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            (cmd, js) = make_message()
+            tasks.append(asyncio.ensure_future(one(cmd, js, scheduled)))
+            i += 1
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - begin
+    return {'elapsed': elapsed, 'stats': {cmd: (h, c[0], c[1]) for (cmd, (h, c)) in stats.items()}}
+
+
+def summarize(result, label='', config=None):
+    """
+    :param result: the result of run_load
+    :return: a JSON serializable record of the run, as saved by --save
+    """
+    record = {'label': label, 'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'config': config or {},
+              'elapsed': result['elapsed'], 'commands': {}}
+    for (cmd, (histogram, errors, timeouts)) in result['stats'].items():
+        record['commands'][cmd] = {'count': histogram.total, 'errors': errors, 'timeouts': timeouts,
+                                   'throughput': histogram.total / result['elapsed'],
+                                   'latency': {str(p): histogram.percentile(p) for p in PERCENTILES},
+                                   'histogram': histogram.to_json()}
+    return record
+
+
+def print_record(record):
+    print('cmd\tcount\terrors\ttimeouts\terror rate\tthroughput/s\t'
+          + '\t'.join('p{}(ms)'.format(p) for p in PERCENTILES))
+    for (cmd, c) in sorted(record['commands'].items()):
+        print('{}\t{}\t{}\t{}\t{:.3%}\t{:.1f}\t'.format(cmd, c['count'], c['errors'], c.get('timeouts', 0),
+                                                       c['errors'] / c['count'], c['throughput'])
+              + '\t'.join('{:.2f}'.format(c['latency'][str(p)] * 1000) for p in PERCENTILES))
+    if 'all' in record['commands']:
+        print()
+        print('{:>12} {:>14} {:>10} {:>14}'.format('Value(ms)', 'Percentile', 'TotalCount', '1/(1-Percentile)'))
+        histogram = LatencyHistogram.from_json(record['commands']['all']['histogram'])
+        for (value, p, count, inverse) in histogram.distribution():
+            print('{:12.3f} {:14.6f} {:10d} {:14.2f}'.format(value * 1000, p, count, inverse))
+
+
+def compare_records(baseline, record):
+    """Print the change of throughput, error rate and latency percentiles from baseline to record."""
+    print('comparing with {} ({})'.format(baseline['label'] or 'unlabelled run', baseline['time']))
+    print('cmd\tmetric\tbaseline\tthis run\tchange')
+    for (cmd, c) in sorted(record['commands'].items()):
+        b = baseline['commands'].get(cmd)
+        if b is None:
+            continue
+        rows = [('throughput/s', b['throughput'], c['throughput']),
+                ('error rate', b['errors'] / b['count'], c['errors'] / c['count']),
+                ('timeout rate', b.get('timeouts', 0) / b['count'], c['timeouts'] / c['count'])]
+        rows += [('p{}(ms)'.format(p), b['latency'][str(p)] * 1000, c['latency'][str(p)] * 1000)
+                 for p in (50, 95, 99)]
+        for (metric, old, new) in rows:
+            change = '{:+.1%}'.format(new / old - 1) if old else '-'
+            print('{}\t{}\t{:.3f}\t{:.3f}\t{}'.format(cmd, metric, old, new, change))
+
+
+def load_records(path):
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test a game server with a mix of TEST, ADD and DEL commands.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--mix', nargs='+', default=['TEST=8', 'ADD=1', 'DEL=1'], help='CMD=WEIGHT')
+    parser.add_argument('--players', nargs='+', default=PLAYER_MODULES, help='player modules the commands carry')
+    parser.add_argument('--concurrency', type=int, default=8, help='clients sending back to back')
+    parser.add_argument('--rate', type=float, help='commands started per second instead of closed loop clients')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--requests', type=int, help='number of commands instead of a duration')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for a reply')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', default='', help='name of the run in the saved results')
+    parser.add_argument('--save', help='append the results of the run to this JSON lines file')
+    parser.add_argument('--compare', help='compare with a run saved in this JSON lines file')
+    parser.add_argument('--baseline', default='-1', help='label or index of the run to compare with')
+    args = parser.parse_args()
+
+    mix = {}
+    for item in args.mix:
+        (cmd, weight) = item.split('=')
+        if cmd not in ('TEST', 'ADD', 'DEL'):
+            parser.error('unknown command {}'.format(cmd))
+        mix[cmd] = float(weight)
+    sources = []
+    for m in args.players:
+        with open(m if m.endswith('.py') else m + '.py', 'r') as f:
+            sources.append(f.read())
+
+    make = message_factory(sources, mix, random.Random(args.seed))
+    result = asyncio.run(run_load(make, args.host, args.port, concurrency=args.concurrency, rate=args.rate,
+                                  duration=args.duration, requests=args.requests, timeout=args.timeout))
+    config = {k: v for (k, v) in vars(args).items() if k not in ('save', 'compare', 'baseline', 'label')}
+    record = summarize(result, args.label, config)
+    print_record(record)
+    if args.compare is not None:
+        records = load_records(args.compare)
+        labelled = [r for r in records if r['label'] == args.baseline]
+        baseline = labelled[-1] if labelled else records[int(args.baseline)]
+        print()
+        compare_records(baseline, record)
+    if args.save is not None:
+        with open(args.save, 'a') as f:
+            f.write(json.dumps(record) + '\n')
@@ -1,5 +1,10 @@
+from async_client import run_test_grid
+from ratings import RatingLadder
+from result_cache import ResultCache
+from scheduler import RequestScheduler
+import asyncio
 import json
-import socket
+import sys
 
 print('Server started.')
 
@@ -16,44 +21,50 @@ result_table = {}
 
 p1_name = 'assign_stupid2_bkp.py'
 p2_name = 'player_new_two.py'
+MAX_IN_FLIGHT = 16
+# replies of unchanged players are reused from the cache, python main.py --refresh asks the server again
+CACHE_PATH = 'test_cache.sqlite'
+FORCE_REFRESH = '--refresh' in sys.argv
+# games kept per TEST of a player that plays randomly
+SAMPLES = 5
+# upload the players once with REG and send TEST by hash; needs a server with REG such as server.py,
+# other servers get the sources inline as before. Off for the default server at send_utility.HOST
+UPLOAD_ONCE = False
+# send the whole grid as one BATCH command streaming a reply per game, TEST by TEST if the server lacks it.
+# Off for the default server at send_utility.HOST
+BATCH = False
+# every game played is rated on the rating ladder in this file, see ratings.py
+RATINGS_PATH = 'ratings.json'
+# seconds a TEST may take over all its attempts; slow TESTs get a duplicate after the p95 latency
+REQUEST_DEADLINE = 120.0
 
 
-def send_to_server(js):
-    """Open socket and send the json string js to server with EOM appended, and wait
-    for \n terminated reply.
-    js - json object to send to server
-    """
-    clientsocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    clientsocket.connect(('128.250.106.25', 5002))
-    clientsocket.send("""{}EOM""".format(js).encode('utf-8'))
-    data = ''
-    while data == '' or data[-1] != "\n":
-        data += clientsocket.recv(1024).decode('utf-8')
-    # print(data)
-    parsed = json.loads(data[8:])
-    result_table[(parsed[1][1], parsed[2][1])] = parsed[-2]
+def print_reply(seat, parsed):
     print(json.dumps(parsed, indent=4, sort_keys=True))
 
-    clientsocket.close()
-
 
 p1 = open(p1_name, 'r').read()
 p2 = open(p2_name, 'r').read()
 
+# every TEST of both seat orders runs concurrently, at most MAX_IN_FLIGHT at a time
+cache = ResultCache(CACHE_PATH)
+ladder = RatingLadder(RATINGS_PATH)
+(first_table, second_table) = asyncio.run(run_test_grid(p1, p2, VICTORIES_CONDITIONS1, VICTORIES_CONDITIONS2,
+                                                        limit=MAX_IN_FLIGHT, on_reply=print_reply, cache=cache,
+                                                        samples=SAMPLES, refresh=FORCE_REFRESH,
+                                                        upload_once=UPLOAD_ONCE, batch=BATCH, ladder=ladder,
+                                                        modules=(p1_name[:-3], p2_name[:-3]),
+                                                        scheduler=RequestScheduler(deadline=REQUEST_DEADLINE,
+                                                                                   max_in_flight=MAX_IN_FLIGHT)))
+cache.close()
+ladder.save()
+
 print('Tested Player goes first')
-for vt1 in VICTORIES_CONDITIONS1:
-    for vt2 in VICTORIES_CONDITIONS2:
-        send_to_server(json.dumps({"cmd": "TEST", "syn": 12, "name": "The Last Jedi", "data": p1,
-                                   "data2": p2, "vt1": vt1, "vt2": vt2}))
+result_table = first_table
 print(str(result_table))
-result_table = {}
 
 print('Tested Player goes second')
-for vt1 in VICTORIES_CONDITIONS1:
-    for vt2 in VICTORIES_CONDITIONS2:
-
-        send_to_server(json.dumps({"cmd": "TEST", "syn": 12, "name": "The Last Jedi", "data": p2,
-                                   "data2": p1, "vt1": vt2, "vt2": vt1}))
+result_table = second_table
 print(str(result_table))
 
 print('Simulation finished')
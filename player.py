@@ -1,8 +1,5 @@
 import numpy as np
-from scipy.stats.stats import pearsonr
-from scipy.stats.stats import linregress
 from collections import defaultdict as dd
-from scipy import stats
 
 
 class Player:
@@ -24,6 +21,9 @@ class Player:
         played_data (dict): Keep track of what this player has played
         enemy_first_turn_1023 (bool): If the opponent put 1023.0 in the first turn
         enemy_first_turn_neg_1023 (bool): If the opponent put -1023.0 in the first turn
+        NUM_OF_TURNS (int): the number of turns of a game
+        rng: the random number generator, np.random unless a seeded np.random.RandomState is given
+        CRITICAL_R (tuple): the smallest correlations of 3, 4, ... 42 values with a two-sided p-value of at most 0.05
 
     TODO:
         * add documentation for each strategy later
@@ -37,6 +37,12 @@ class Player:
     played_data = dd(list)
     enemy_first_turn_1023 = False
     enemy_first_turn_neg_1023 = False
+    NUM_OF_TURNS = 10
+    rng = np.random
+    CRITICAL_R = (0.9969, 0.9500, 0.8783, 0.8114, 0.7545, 0.7067, 0.6664, 0.6319, 0.6021, 0.5760,
+                  0.5529, 0.5324, 0.5140, 0.4973, 0.4821, 0.4683, 0.4555, 0.4438, 0.4329, 0.4227,
+                  0.4132, 0.4044, 0.3961, 0.3882, 0.3809, 0.3739, 0.3673, 0.3610, 0.3550, 0.3494,
+                  0.3440, 0.3388, 0.3338, 0.3291, 0.3246, 0.3202, 0.3160, 0.3120, 0.3081, 0.3044)
 
     def take_turn(self, data, victory):
         """Must return a dictionary with the same keys as data, and with single float values
@@ -89,16 +95,16 @@ class Player:
                 ret_d[self.v_col] = -1023.0
                 self.enemy_first_turn_1023 = True
             else:
-                ret_d[self.v_col] = np.random.uniform(-500, 500)
-        elif 3 <= self.turn_num <= 9:
+                ret_d[self.v_col] = self.rng.uniform(-500, 500)
+        elif 3 <= self.turn_num < self.NUM_OF_TURNS:
             if self.enemy_first_turn_1023:
                 ret_d[self.v_col] = -1023.0
             else:
-                ret_d[self.v_col] = np.random.uniform(-500, 500)
-        elif self.turn_num == 10 and not self.enemy_first_turn_1023:
+                ret_d[self.v_col] = self.rng.uniform(-500, 500)
+        elif self.turn_num == self.NUM_OF_TURNS and not self.enemy_first_turn_1023:
             ret_d[self.v_col] = 1023.0
         else:
-            ret_d[self.v_col] = np.random.uniform(-500, 500)
+            ret_d[self.v_col] = self.rng.uniform(-500, 500)
 
         self.counter_enemy_max(ret_d)
 
@@ -116,16 +122,16 @@ class Player:
                 ret_d[self.v_col] = 1023.0
                 self.enemy_first_turn_neg_1023 = True
             else:
-                ret_d[self.v_col] = np.random.uniform(-500, 500)
-        elif 3 <= self.turn_num <= 9:
+                ret_d[self.v_col] = self.rng.uniform(-500, 500)
+        elif 3 <= self.turn_num < self.NUM_OF_TURNS:
             if self.enemy_first_turn_neg_1023:
                 ret_d[self.v_col] = 1023.0
             else:
-                ret_d[self.v_col] = np.random.uniform(-500, 500)
-        elif self.turn_num == 10 and not self.enemy_first_turn_neg_1023:
+                ret_d[self.v_col] = self.rng.uniform(-500, 500)
+        elif self.turn_num == self.NUM_OF_TURNS and not self.enemy_first_turn_neg_1023:
             ret_d[self.v_col] = -1023.0
         else:
-            ret_d[self.v_col] = np.random.uniform(-500, 500)
+            ret_d[self.v_col] = self.rng.uniform(-500, 500)
 
         self.counter_enemy_min(ret_d)
 
@@ -143,13 +149,13 @@ class Player:
             ret_d[self.v_col] = 1023.0  # or random(0,1023)?
         else:
             ret_d[self.v_col] = -1023.0
-        if self.turn_num == 10:
+        if self.turn_num == self.NUM_OF_TURNS:
             # take a guess
             if self.is_first_to_move:
                 e_col = self.data[self.v_col][1::2]
             else:
                 e_col = self.data[self.v_col][::2]
-            mode = stats.mode(e_col)[0][0]
+            mode = self.mode(e_col)
 
             ret_d[self.v_col] = min(max(-current_sum-mode, -1023.0), 1023.0)
         self.counter_enemy_mix(ret_d)
@@ -164,8 +170,7 @@ class Player:
         # elif self.turn_num == 10:
         #     ret_d[self.v_col] = 1023.0
         else:
-            slope, intercept, r_value, p_value, std_err = \
-                linregress(range((self.turn_num-1)*2+1), self.data[self.v_col])
+            (slope, intercept) = self.fit_line(range((self.turn_num-1)*2+1), self.data[self.v_col])
             ret_d[self.v_col] = max(-1023.0, min(intercept + slope * ((self.turn_num-1)*2+1), 1023.0))
 
         self.counter_enemy_mix(ret_d)
@@ -181,8 +186,7 @@ class Player:
         #     ret_d[self.v_col] = 1023.0
         else:
             x = np.array(range((self.turn_num-1)*2+1))
-            slope, intercept, r_value, p_value, std_err = \
-                linregress(list(x*x), self.data[self.v_col])
+            (slope, intercept) = self.fit_line(list(x*x), self.data[self.v_col])
             y = np.sqrt(intercept + slope * ((self.turn_num-1)*2+1))
             ret_d[self.v_col] = max(-1023.0, min(y, 1023.0))
 
@@ -217,32 +221,57 @@ class Player:
     def check_enemy_col(self):
         if self.turn_num <= 3:
             return
-        for col in self.data:
-            if col != self.v_col:
-                arr = np.array(self.data[col])
-                (r, p) = pearsonr(arr, range(len(arr)))
-                if p <= 0.05 and r >= 0.9:
-                    self.enemy_col_cond[col] = 'Linear'
-                    continue
-                arr_2 = arr * arr
-                (r, p) = pearsonr(arr_2, range(len(arr)))
-                if p <= 0.05 and r >= 0.9:
-                    self.enemy_col_cond[col] = 'Quadratic'
-                    continue
-                if np.mean(arr) < 0.000001:
-                    self.enemy_col_cond[col] = 'ZeroM'
-                    continue
-
-        for col in self.data:
-            if col != self.v_col:
-                if self.is_first_to_move:
-                    arr = np.array(self.data[col][1::2])
-                else:
-                    arr = np.array(self.data[col][::2])
-                if (arr > 0).all():
-                    self.enemy_col_cond[col] = 'SumPos'
-                if (arr < 0).all():
-                    self.enemy_col_cond[col] = 'SumNeg'
+        cols = [col for col in self.data if col != self.v_col]
+        if not cols:
+            return
+        # one row per column, so that each statistic is computed for every column at once
+        arr = np.array([self.data[col] for col in cols], dtype=float)
+        # the p-value of pearsonr is at most 0.05 exactly when r reaches the critical r of that many values
+        r_min = max(0.9, self.critical_r(arr.shape[1]))
+        linear = self.row_correlations(arr) >= r_min
+        quadratic = self.row_correlations(arr * arr) >= r_min
+        zero_m = arr.mean(axis=1) < 0.000001
+        if self.is_first_to_move:
+            rows = arr[:, 1::2]
+        else:
+            rows = arr[:, ::2]
+        sum_pos = (rows > 0).all(axis=1)
+        sum_neg = (rows < 0).all(axis=1)
+
+        for (i, col) in enumerate(cols):
+            if linear[i]:
+                self.enemy_col_cond[col] = 'Linear'
+            elif quadratic[i]:
+                self.enemy_col_cond[col] = 'Quadratic'
+            elif zero_m[i]:
+                self.enemy_col_cond[col] = 'ZeroM'
+
+        for (i, col) in enumerate(cols):
+            if sum_pos[i]:
+                self.enemy_col_cond[col] = 'SumPos'
+            if sum_neg[i]:
+                self.enemy_col_cond[col] = 'SumNeg'
+
+    def row_correlations(self, arr):
+        """
+        :param arr: 2-D array
+        :return: the Pearson correlation of each row of arr with the row indices, as pearsonr gives it,
+                 nan for a constant row
+        """
+        x = np.arange(arr.shape[1]) - (arr.shape[1] - 1) / 2
+        dev = arr - arr.mean(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = dev.dot(x) / (np.linalg.norm(dev, axis=1) * np.linalg.norm(x))
+        return np.clip(r, -1.0, 1.0)
+
+    def critical_r(self, n):
+        """
+        :return: the smallest correlation of n values whose two-sided p-value is at most 0.05, from CRITICAL_R
+                 up to its last n and by the normal approximation beyond
+        """
+        if n - 3 < len(self.CRITICAL_R):
+            return self.CRITICAL_R[n - 3]
+        return 1.959964 / np.sqrt(n - 2 + 1.959964 * 1.959964)
 
     def counter_enemy_max(self, ret_d):
         for k in self.data.keys():
@@ -251,7 +280,7 @@ class Player:
                 if current_sum == 0:
                     ret_d[k] = -1023.0
                 else:
-                    ret_d[k] = np.random.uniform(-100.0, 100.0)
+                    ret_d[k] = self.rng.uniform(-100.0, 100.0)
                 if k in self.enemy_col_cond and self.enemy_col_cond[k] == 'SumNeg':
                     ret_d[k] = 1022.0
                 if k in self.enemy_col_cond and self.enemy_col_cond[k] == 'SumPos':
@@ -266,7 +295,7 @@ class Player:
                 if current_sum == 0:
                     ret_d[k] = 1023.0
                 else:
-                    ret_d[k] = np.random.uniform(-100.0, 100.0)
+                    ret_d[k] = self.rng.uniform(-100.0, 100.0)
                 if k in self.enemy_col_cond and self.enemy_col_cond[k] == 'SumNeg':
                     ret_d[k] = 1023.0
                 if k in self.enemy_col_cond and self.enemy_col_cond[k] == 'SumPos':
@@ -283,7 +312,7 @@ class Player:
                     if self.turn_num == 1 or current_sum == 0:
                         ret_d[k] = -1023.0
                     else:
-                        ret_d[k] = np.random.uniform(-100.0, 100.0)
+                        ret_d[k] = self.rng.uniform(-100.0, 100.0)
                     if k in self.enemy_col_cond and self.enemy_col_cond[k] == 'SumNeg':
                         ret_d[k] = 1023.0
                     if k in self.enemy_col_cond and self.enemy_col_cond[k] == 'SumPos':
@@ -292,7 +321,7 @@ class Player:
                     if self.turn_num == 1 or current_sum == 0:
                         ret_d[k] = 1023.0
                     else:
-                        ret_d[k] = np.random.uniform(-100.0, 100.0)
+                        ret_d[k] = self.rng.uniform(-100.0, 100.0)
                     if k in self.enemy_col_cond and self.enemy_col_cond[k] == 'SumNeg':
                         ret_d[k] = 1023.0
                     if k in self.enemy_col_cond and self.enemy_col_cond[k] == 'SumPos':
@@ -302,6 +331,25 @@ class Player:
 
         return ret_d
 
+    def fit_line(self, x, y):
+        """Utility function
+        Least squares line through the points (x, y), computed as scipy.stats.linregress computes it.
+
+        :return: (slope, intercept)
+        """
+        (ssxm, ssxym, _, _) = np.cov(x, y, bias=True).flat
+        slope = ssxym / ssxm
+        return (slope, np.mean(y) - slope * np.mean(x))
+
+    def mode(self, values):
+        """Utility function
+        :return: the most common of values, the smallest one if several are equally common
+        """
+        counts = dd(int)
+        for v in values:
+            counts[v] += 1
+        return min(counts, key=lambda v: (-counts[v], v))
+
     def __repr__(self):
         """
         Print the representation of the player
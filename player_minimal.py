@@ -5,6 +5,7 @@ class Player:
     data = {}
 
     is_first_to_move = True
+    rng = np.random
 
     def take_turn(self, data, victory):
         """Must return a dictionary with the same keys as data, and with single float values
@@ -17,7 +18,7 @@ class Player:
         """
         self.data = data
         self.v_condition = victory
-        return {k: np.random.uniform(-1023.0, 1023.0) for k in data}
+        return {k: self.rng.uniform(-1023.0, 1023.0) for k in data}
 
     def __repr__(self):
         """
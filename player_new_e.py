@@ -1,7 +1,6 @@
 import numpy as np
-from scipy.stats.stats import linregress
+import bisect
 from collections import defaultdict as dd
-from scipy import stats
 
 
 class Player:
@@ -22,7 +21,10 @@ class Player:
                                 E.g. enemy_col_cond['Max'] = 'Simon'
                                 it means Simon column may have victory conditions of Max
         turn_num (int): the number of turns at the moment
+        NUM_OF_TURNS (int): the number of turns of a game
         played_data (dict): Keep track of what this player has played
+        indexed_rows (dict): the number of rows of each column recorded in occupied_keys
+        occupied_keys (list): sorted keys, the values times SCALE, of the multiples of EPSILON in the matrix
         enemy_first_turn_1023 (bool): If the opponent put 1023.0 in the first turn
         enemy_first_turn_neg_1023 (bool): If the opponent put -1023.0 in the first turn
 
@@ -40,8 +42,13 @@ class Player:
     unique_max_col_count = dd(int)
     unique_min_col_count = dd(int)
 
+    indexed_rows = dict()
+    occupied_keys = list()
+
     EPSILON = 0.00001
+    SCALE = 100000
     BOUNDARY = 30000.0
+    NUM_OF_TURNS = 10
 
     def take_turn(self, data, victory):
         """Must return a dictionary with the same keys as data, and with single float values
@@ -58,6 +65,10 @@ class Player:
 
         # update the turn number
         self.turn_num = (len(self.data[list(self.data.keys())[0]])-1)//2+1
+        # record the values of the rows appended since the last turn, from scratch in a new game
+        if self.turn_num == 1:
+            self.reset_value_index()
+        self.index_new_rows()
 
         # check if the player's row is entered before or after the opponent
         # even if two rows are inserted together at each turn, there is an order
@@ -101,10 +112,10 @@ class Player:
         """
         ret_d = dict()
 
-        if self.turn_num <= 9:
+        if self.turn_num < self.NUM_OF_TURNS:
             ret_d[self.v_col] = self.BOUNDARY  # to rule out SumNeg
 
-        elif self.turn_num == 10:
+        elif self.turn_num == self.NUM_OF_TURNS:
             next_unique_max = self.get_next_unique_max()
             if 'Max' in self.enemy_col_cond:
                 ret_d[self.enemy_col_cond['Max']] = next_unique_max
@@ -124,10 +135,10 @@ class Player:
         """
         ret_d = dict()
 
-        if self.turn_num <= 9:
+        if self.turn_num < self.NUM_OF_TURNS:
             ret_d[self.v_col] = -self.BOUNDARY  # to rule out SumNeg
 
-        elif self.turn_num == 10:
+        elif self.turn_num == self.NUM_OF_TURNS:
             next_unique_min = self.get_next_unique_min()
             if 'Min' in self.enemy_col_cond:
                 ret_d[self.enemy_col_cond['Min']] = next_unique_min
@@ -150,7 +161,7 @@ class Player:
             ret_d[self.v_col] = current_sum + self.EPSILON  # or random(0,1023)?
         else:
             ret_d[self.v_col] = -current_sum - self.EPSILON
-        if self.turn_num == 10:
+        if self.turn_num == self.NUM_OF_TURNS:
             # take a guess
 
             if self.is_first_to_move:
@@ -158,7 +169,7 @@ class Player:
             else:
                 e_col = self.data[self.v_col][1::2]
 
-            guess = stats.mode(e_col)[0][0]
+            guess = self.mode(e_col)
 
             if 'Max' in self.enemy_col_cond and self.enemy_col_cond['Max'] == self.v_col:
                 guess = self.get_next_unique_max()
@@ -178,8 +189,7 @@ class Player:
         # elif self.turn_num == 10:
         #     ret_d[self.v_col] = self.BOUNDARY
         else:
-            slope, intercept, r_value, p_value, std_err = \
-                linregress(range((self.turn_num-1)*2+1), self.data[self.v_col])
+            (slope, intercept) = self.fit_line(range((self.turn_num-1)*2+1), self.data[self.v_col])
             ret_d[self.v_col] = max(-self.BOUNDARY, min(intercept + slope * ((self.turn_num-1)*2+1), self.BOUNDARY))
 
         self.counter_enemy_mix(ret_d)
@@ -211,8 +221,7 @@ class Player:
         #     ret_d[self.v_col] = self.BOUNDARY
         else:
             x = np.array(range((self.turn_num-1)*2+1))
-            slope, intercept, r_value, p_value, std_err = \
-                linregress(list(x*x), self.data[self.v_col])
+            (slope, intercept) = self.fit_line(list(x*x), self.data[self.v_col])
             y = np.sqrt(intercept + slope * ((self.turn_num-1)*2+1))
             ret_d[self.v_col] = max(-self.BOUNDARY, min(y, self.BOUNDARY))
 
@@ -253,7 +262,7 @@ class Player:
         if self.turn_num <= 3:
             return
 
-        if self.turn_num == 9:
+        if self.turn_num == self.NUM_OF_TURNS - 1:
             sorted_max = sorted(self.unique_max_col_count.items(), key=lambda x: x[1], reverse=True)
             sorted_min = sorted(self.unique_min_col_count.items(), key=lambda x: x[1], reverse=True)
             if sorted_max and sorted_max[0][1] >= 4:
@@ -268,16 +277,14 @@ class Player:
                 else:
                     target = np.array(self.data[col][-2])
                 arr = np.array(self.data[col][:6])    # first 5 numbers
-                slope, intercept, r_value, p_value, std_err = \
-                    linregress(range(len(arr)), arr)
+                (slope, intercept) = self.fit_line(range(len(arr)), arr)
 
                 pred = max(-self.BOUNDARY, min(intercept + slope * ((self.turn_num-2)*2+1), self.BOUNDARY))
                 if abs(pred - target) < 100:
                     self.enemy_col_cond['Linear'] = col
 
                 arr_2 = arr * arr
-                slope, intercept, r_value, p_value, std_err = \
-                    linregress(range(len(arr_2)), arr_2)
+                (slope, intercept) = self.fit_line(range(len(arr_2)), arr_2)
                 pred = max(-self.BOUNDARY, min(intercept + slope * ((self.turn_num - 2) * 2 + 1), self.BOUNDARY))
                 if abs(pred - target) < 100:
                     self.enemy_col_cond['Quadratic'] = col
@@ -304,7 +311,7 @@ class Player:
         current_max = self.get_current_unique_max()
         current_min = self.get_current_unique_min()
 
-        if self.turn_num == 10:
+        if self.turn_num == self.NUM_OF_TURNS:
             if 'Max' in self.enemy_col_cond:
                 if current_max > 0:
                     ret_d[self.enemy_col_cond['Max']] = current_max
@@ -338,11 +345,11 @@ class Player:
                         ret_d[k] = self.BOUNDARY
                 else:
                     # if current unique max/min in this col, make it not unique
-                    if self.turn_num != 10 and current_max > 0 and current_max in self.data[k]:
+                    if self.turn_num != self.NUM_OF_TURNS and current_max > 0 and current_max in self.data[k]:
                         ret_d[k] = current_max
                         # increment the col count
                         self.unique_max_col_count[k] += 1
-                    elif self.turn_num != 10 and current_min < 0 and current_min in self.data[k]:
+                    elif self.turn_num != self.NUM_OF_TURNS and current_min < 0 and current_min in self.data[k]:
                         ret_d[k] = current_min
                         # increment the col count
                         self.unique_min_col_count[k] += 1
@@ -366,10 +373,87 @@ class Player:
         #         ret_d[k] = self.BOUNDARY
 
         for k in ret_d:
-            ret_d[k] = round(float(ret_d[k]), 5)
+            # convert to float again, rounding the values off the grid onto it
+            if self.to_key(ret_d[k]) is None:
+                ret_d[k] = round(float(ret_d[k]), 5)
+            else:
+                ret_d[k] = float(ret_d[k])
 
         return ret_d
 
+    def reset_value_index(self):
+        """Utility function
+        Empty the value index for a new game.
+        """
+        self.indexed_rows.clear()
+        del self.occupied_keys[:]
+
+    def index_new_rows(self):
+        """Utility function
+        Record the values of the rows appended to the game matrix since the last call in occupied_keys.
+        """
+        # a matrix shorter than the rows indexed belongs to another game
+        if any(len(self.data[col]) < self.indexed_rows.get(col, 0) for col in self.data):
+            self.reset_value_index()
+        for col in self.data:
+            column = self.data[col]
+            for number in column[self.indexed_rows.get(col, 0):]:
+                self.occupy(number)
+            self.indexed_rows[col] = len(column)
+
+    def to_key(self, number):
+        """Utility function
+        Values played by this player are multiples of EPSILON. They are handled as integer keys,
+        the value times SCALE, so that stepping, ordering and lookups are exact without rounding.
+
+        :return: the key of number, or None if number is not a multiple of EPSILON within the boundaries
+        """
+        if -self.BOUNDARY <= number <= self.BOUNDARY:
+            key = int(round(number * self.SCALE))
+            if key / self.SCALE == number:
+                return key
+        return None
+
+    def from_key(self, key):
+        """Utility function
+        :return: the float value of a key, the same float round(value, 5) gives
+        """
+        return key / self.SCALE
+
+    def occupy(self, number):
+        """Utility function
+        Record the key of number in occupied_keys, if it has one.
+        """
+        key = self.to_key(number)
+        if key is not None:
+            i = bisect.bisect_left(self.occupied_keys, key)
+            if i == len(self.occupied_keys) or self.occupied_keys[i] != key:
+                self.occupied_keys.insert(i, key)
+
+    def occupied_run(self, j):
+        """Utility function
+        :param j: an index of occupied_keys
+        :return: (first, last) indices of the run of consecutive keys containing occupied_keys[j]
+        """
+        keys = self.occupied_keys
+        # keys[i] - i never decreases, and stays the same exactly along a run of consecutive keys
+        (lo, hi) = (0, j)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[mid] - mid < keys[j] - j:
+                lo = mid + 1
+            else:
+                hi = mid
+        first = lo
+        (lo, hi) = (j, len(keys) - 1)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if keys[mid] - mid > keys[j] - j:
+                hi = mid - 1
+            else:
+                lo = mid
+        return (first, lo)
+
     def get_current_unique_max(self):
         nums_count = dd(int)
         for col in self.data.keys():
@@ -399,29 +483,54 @@ class Player:
         return current_min
 
     def get_next_unique_max(self):
-        m = self.BOUNDARY
-        while m >= -self.BOUNDARY:
-            for col in self.data:
-                if m in self.data[col]:
-                    m = self.next_after(m, -1)
-                    break
-            else:
-                return m
-        return m
+        # the first number below the run of occupied keys from the boundary down, see occupied_run
+        top = self.to_key(self.BOUNDARY)
+        j = bisect.bisect_right(self.occupied_keys, top) - 1
+        if j < 0 or self.occupied_keys[j] != top:
+            return self.from_key(top)
+        first = self.occupied_run(j)[0]
+        return self.from_key(max(self.occupied_keys[first] - 1, -top - 1))
 
     def get_next_unique_min(self):
-        m = -self.BOUNDARY
-        while m <= self.BOUNDARY:
-            for col in self.data:
-                if m in self.data[col]:
-                    m = self.next_after(m, 1)
-                    break
-            else:
-                return m
-        return m
+        top = self.to_key(self.BOUNDARY)
+        j = bisect.bisect_left(self.occupied_keys, -top)
+        if j == len(self.occupied_keys) or self.occupied_keys[j] != -top:
+            return self.from_key(-top)
+        last = self.occupied_run(j)[1]
+        return self.from_key(min(self.occupied_keys[last] + 1, top + 1))
+
+    def fit_line(self, x, y):
+        """Utility function
+        Least squares line through the points (x, y), computed as scipy.stats.linregress computes it.
+
+        :return: (slope, intercept)
+        """
+        (ssxm, ssxym, _, _) = np.cov(x, y, bias=True).flat
+        slope = ssxym / ssxm
+        return (slope, np.mean(y) - slope * np.mean(x))
+
+    def mode(self, values):
+        """Utility function
+        :return: the most common of values, the smallest one if several are equally common
+        """
+        counts = dd(int)
+        for v in values:
+            counts[v] += 1
+        return min(counts, key=lambda v: (-counts[v], v))
 
     def next_after(self, num, direction):
-        return round(num + direction * self.EPSILON, 5)
+        """Utility function
+        Get the next floating number with the precision of self.EPSILON
+
+        :param num: the base number to increment/decrement
+        :param direction: +1/-1 as the direction to move
+        :return: the next floating number towards direction dir
+        """
+        key = self.to_key(num)
+        if key is None:
+            # a number off the grid, e.g. from the opponent, is rounded onto it
+            return round(num + direction * self.EPSILON, 5)
+        return self.from_key(key + direction)
 
     def __repr__(self):
         """
@@ -1,7 +1,7 @@
 import numpy as np
-from scipy.stats.stats import linregress
+import bisect
+import heapq
 from collections import defaultdict as dd
-from scipy import stats
 
 
 class Player:
@@ -29,11 +29,19 @@ class Player:
         unique_max_col_count (dd(int)): the number of times a column contains the unique max
         unique_min_col_count (dd(int)): the number of times a column contains the unique min
 
+        value_count (dd(int)): the number of times each value appears in the rows of the game matrix indexed so far
+        indexed_rows (dict): the number of rows of each column counted in value_count
+        unique_max_heap (list): heap of the negated values which appeared once when they were pushed
+        unique_min_heap (list): heap of the values which appeared once when they were pushed
+        occupied_keys (list): sorted keys, the values times SCALE, of the multiples of EPSILON in the matrix
+
         v_condition (str): The victory condition of the player
         v_col (str): The victory column of the player
 
         EPSILON (float): constant - the minimum change in a floating number
+        SCALE (int): constant - the number of EPSILON in 1.0
         BOUNDARY (float): constant - the boundary of numbers for this game
+        NUM_OF_TURNS (int): constant - the number of turns of a game
     """
 
     data = dict()
@@ -45,11 +53,19 @@ class Player:
     unique_max_col_count = dd(int)
     unique_min_col_count = dd(int)
 
+    value_count = dd(int)
+    indexed_rows = dict()
+    unique_max_heap = list()
+    unique_min_heap = list()
+    occupied_keys = list()
+
     v_condition = None
     v_col = None
 
     EPSILON = 0.00001
+    SCALE = 100000
     BOUNDARY = 1023.0
+    NUM_OF_TURNS = 10
 
     def take_turn(self, data, victory):
         """This function is called by the server each turn to give 5 numbers to append to the game matrix.
@@ -62,6 +78,10 @@ class Player:
         self.data = data
         (self.v_condition, self.v_col) = victory
         self.turn_num = (len(self.data[list(self.data.keys())[0]])-1)//2+1
+        # count the values of the rows appended since the last turn, from scratch in a new game
+        if self.turn_num == 1:
+            self.reset_value_index()
+        self.index_new_rows()
         # check if the player's row is entered before or after the opponent
         # even if two rows are inserted together at each turn, there is an order
         if self.turn_num < 3:
@@ -109,9 +129,9 @@ class Player:
         ret_d = dict()
 
         # for the victory column, fill in the upper boundary deducting a small number in round 1-9
-        ret_d[self.v_col] = round(self.BOUNDARY - (self.turn_num-1) * self.EPSILON, 5)
+        ret_d[self.v_col] = self.from_key(self.to_key(self.BOUNDARY) - (self.turn_num-1))
 
-        if self.turn_num == 10:
+        if self.turn_num == self.NUM_OF_TURNS:
             # in round 10, assign the float that is 2 unit smaller than the
             # current unique max to the winning column
             ret_d[self.v_col] = self.next_after(self.get_next_unique_max(), -1)
@@ -144,9 +164,9 @@ class Player:
         """
         ret_d = dict()
         # for the victory column, fill in the lower boundary adding a small number in round 1-9
-        ret_d[self.v_col] = round(-1023.0 + (self.turn_num-1) * self.EPSILON, 5)
+        ret_d[self.v_col] = self.from_key(self.to_key(-1023.0) + (self.turn_num-1))
 
-        if self.turn_num == 10:
+        if self.turn_num == self.NUM_OF_TURNS:
             # in round 10, assign the float that is 2 unit larger than the
             # current unique min to the winning column
             ret_d[self.v_col] = self.next_after(self.get_next_unique_min(), 1)
@@ -187,7 +207,7 @@ class Player:
             ret_d[self.v_col] = min(max(current_sum + self.EPSILON, -self.BOUNDARY), self.BOUNDARY)
         else:
             ret_d[self.v_col] = min(max(-current_sum - self.EPSILON, -self.BOUNDARY), self.BOUNDARY)
-        if self.turn_num == 10:
+        if self.turn_num == self.NUM_OF_TURNS:
             # Extract opponent's data and predict what they might put in for the last round
             if self.is_first_to_move:
                 e_col = self.data[self.v_col][2::2]
@@ -195,7 +215,7 @@ class Player:
                 e_col = self.data[self.v_col][1::2]
 
             # default guess is the mode
-            guess = stats.mode(e_col)[0][0]
+            guess = self.mode(e_col)
 
             # if Max/Min is detected in our own col, use the next unique value
             if 'Max' in self.enemy_col_cond and self.enemy_col_cond['Max'] == self.v_col:
@@ -224,8 +244,7 @@ class Player:
             ret_d[self.v_col] = 0.0
         else:
             # use linear regression for the next value
-            slope, intercept, r_value, p_value, std_err = \
-                linregress(range((self.turn_num-1)*2+1), self.data[self.v_col])
+            (slope, intercept) = self.fit_line(range((self.turn_num-1)*2+1), self.data[self.v_col])
             ret_d[self.v_col] = max(-self.BOUNDARY, min(intercept + slope * ((self.turn_num-1)*2+1), self.BOUNDARY))
 
         self.counter_enemy_mix(ret_d)
@@ -261,8 +280,7 @@ class Player:
             ret_d[self.v_col] = 0.0
         else:
             x = np.array(range((self.turn_num-1)*2+1))
-            slope, intercept, r_value, p_value, std_err = \
-                linregress(list(x*x), self.data[self.v_col])
+            (slope, intercept) = self.fit_line(list(x*x), self.data[self.v_col])
             y = np.sqrt(intercept + slope * ((self.turn_num-1)*2+1))
             ret_d[self.v_col] = max(-self.BOUNDARY, min(y, self.BOUNDARY))
 
@@ -347,7 +365,7 @@ class Player:
                         self.enemy_col_cond['SumNeg'] = col
 
         # at the second last round we detect if there is any Max/Min
-        if self.turn_num == 9:
+        if self.turn_num == self.NUM_OF_TURNS - 1:
             # which columns have contained the unique max/min for the most number of times
             sorted_max = sorted(self.unique_max_col_count.items(), key=lambda x: x[1], reverse=True)
             sorted_min = sorted(self.unique_min_col_count.items(), key=lambda x: x[1], reverse=True)
@@ -380,7 +398,7 @@ class Player:
         current_min = self.get_current_unique_min()
 
         #  special defeat logic in the last turn
-        if self.turn_num == 10:
+        if self.turn_num == self.NUM_OF_TURNS:
             if 'Max' in self.enemy_col_cond:
                 if current_max > 0:
                     ret_d[self.enemy_col_cond['Max']] = current_max
@@ -440,11 +458,11 @@ class Player:
                         ret_d[k] = self.BOUNDARY
                 else:
                     # if current unique max/min in this col, make it not unique
-                    if self.turn_num != 10 and current_max > 0 and current_max in self.data[k]:
+                    if self.turn_num != self.NUM_OF_TURNS and current_max > 0 and current_max in self.data[k]:
                         ret_d[k] = current_max
                         # increment the col count
                         self.unique_max_col_count[k] += 1
-                    elif self.turn_num != 10 and current_min < 0 and current_min in self.data[k]:
+                    elif self.turn_num != self.NUM_OF_TURNS and current_min < 0 and current_min in self.data[k]:
                         ret_d[k] = current_min
                         # increment the col count
                         self.unique_min_col_count[k] += 1
@@ -456,84 +474,168 @@ class Player:
                 count += 1
 
         for k in ret_d:
-            # convert to float again...
-            ret_d[k] = round(float(ret_d[k]), 5)
+            # convert to float again, rounding the values off the grid onto it
+            if self.to_key(ret_d[k]) is None:
+                ret_d[k] = round(float(ret_d[k]), 5)
+            else:
+                ret_d[k] = float(ret_d[k])
 
         return ret_d
 
-    def get_current_unique_max(self):
+    def reset_value_index(self):
         """Utility function
-        :return: the unique maximum value in the current game matrix.
+        Empty the value index for a new game.
         """
-        # find each number with its frequency
-        nums_count = dd(int)
+        self.value_count.clear()
+        self.indexed_rows.clear()
+        del self.unique_max_heap[:]
+        del self.unique_min_heap[:]
+        del self.occupied_keys[:]
+
+    def index_new_rows(self):
+        """Utility function
+        Count the values of the rows appended to the game matrix since the last call.
+        A value is pushed onto the heaps when it first appears. Counts only grow within a game,
+        so a value that appears again is never unique again and is popped once it reaches the top.
+        """
+        # a matrix shorter than the rows indexed belongs to another game
+        if any(len(self.data[col]) < self.indexed_rows.get(col, 0) for col in self.data):
+            self.reset_value_index()
         for col in self.data:
-            for number in self.data[col]:
-                nums_count[number] += 1
+            column = self.data[col]
+            for number in column[self.indexed_rows.get(col, 0):]:
+                self.value_count[number] += 1
+                if self.value_count[number] == 1:
+                    heapq.heappush(self.unique_max_heap, -number)
+                    heapq.heappush(self.unique_min_heap, number)
+                    self.occupy(number)
+            self.indexed_rows[col] = len(column)
+
+    def to_key(self, number):
+        """Utility function
+        Values played by this player are multiples of EPSILON. They are handled as integer keys,
+        the value times SCALE, so that stepping, ordering and lookups are exact without rounding.
+
+        :return: the key of number, or None if number is not a multiple of EPSILON within the boundaries
+        """
+        if -self.BOUNDARY <= number <= self.BOUNDARY:
+            key = int(round(number * self.SCALE))
+            if key / self.SCALE == number:
+                return key
+        return None
+
+    def from_key(self, key):
+        """Utility function
+        :return: the float value of a key, the same float round(value, 5) gives
+        """
+        return key / self.SCALE
+
+    def occupy(self, number):
+        """Utility function
+        Record the key of number in occupied_keys, if it has one.
+        """
+        key = self.to_key(number)
+        if key is not None:
+            i = bisect.bisect_left(self.occupied_keys, key)
+            if i == len(self.occupied_keys) or self.occupied_keys[i] != key:
+                self.occupied_keys.insert(i, key)
+
+    def occupied_run(self, j):
+        """Utility function
+        :param j: an index of occupied_keys
+        :return: (first, last) indices of the run of consecutive keys containing occupied_keys[j]
+        """
+        keys = self.occupied_keys
+        # keys[i] - i never decreases, and stays the same exactly along a run of consecutive keys
+        (lo, hi) = (0, j)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[mid] - mid < keys[j] - j:
+                lo = mid + 1
+            else:
+                hi = mid
+        first = lo
+        (lo, hi) = (j, len(keys) - 1)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if keys[mid] - mid > keys[j] - j:
+                hi = mid - 1
+            else:
+                lo = mid
+        return (first, lo)
 
-        # sort the number descending and get the largest whose freq == 1
-        current_max = -self.BOUNDARY
-        for num in sorted(nums_count.keys(), reverse=True):
-            if nums_count[num] == 1:
-                current_max = num
-                break
+    def get_current_unique_max(self):
+        """Utility function
+        :return: the unique maximum value in the current game matrix.
+        """
+        # drop the values which appeared again since they were pushed
+        while self.unique_max_heap and self.value_count[-self.unique_max_heap[0]] != 1:
+            heapq.heappop(self.unique_max_heap)
 
-        return current_max
+        if self.unique_max_heap:
+            return -self.unique_max_heap[0]
+        return -self.BOUNDARY
 
     def get_current_unique_min(self):
         """Utility function
         :return: the unique minimum value in the current game matrix.
         """
-        # find each number with its frequency
-        nums_count = dd(int)
-        for col in self.data:
-            for number in self.data[col]:
-                nums_count[number] += 1
+        while self.unique_min_heap and self.value_count[self.unique_min_heap[0]] != 1:
+            heapq.heappop(self.unique_min_heap)
 
-        # sort the number ascending and get the largest whose freq == 1
-        current_min = self.BOUNDARY
-        for num in sorted(nums_count.keys()):
-            if nums_count[num] == 1:
-                current_min = num
-                break
-
-        return current_min
+        if self.unique_min_heap:
+            return self.unique_min_heap[0]
+        return self.BOUNDARY
 
     def get_next_unique_max(self):
         """Utility function
-        From the boundary to check each number.
-        If it is not yet added in the matrix, return the value
+        From the boundary, find the first number not yet added in the matrix.
+        The occupied numbers right below the boundary form a run of consecutive keys in occupied_keys,
+        so the first free one is found by a binary search instead of stepping through each of them.
 
         :return: the maximum value possible that hasn't been put into the game matrix.
         """
-        m = self.BOUNDARY
-        while m > -self.BOUNDARY:
-            for col in self.data:
-                if m in self.data[col]:
-                    m = self.next_after(m, -1)
-                    break
-            else:
-                return m    # return m if it is not yet in the matrix
+        top = self.to_key(self.BOUNDARY)
+        j = bisect.bisect_right(self.occupied_keys, top) - 1
+        if j < 0 or self.occupied_keys[j] != top:
+            return self.from_key(top)    # the boundary is not yet in the matrix
 
+        first = self.occupied_run(j)[0]
         # still return some value in the case there is no unique number at all within the range
-        return m
+        return self.from_key(max(self.occupied_keys[first] - 1, -top))
 
     def get_next_unique_min(self):
         """Utility function
-        From the boundary to check each number.
-        If it is not yet added in the matrix, return the value
+        From the boundary, find the first number not yet added in the matrix.
 
         :return: the minimum value possible that hasn't been put into the game matrix.
         """
-        m = -self.BOUNDARY
-        while m < self.BOUNDARY:
-            for col in self.data:
-                if m in self.data[col]:
-                    m = self.next_after(m, 1)
-                    break
-            else:
-                return m
-        return m
+        top = self.to_key(self.BOUNDARY)
+        j = bisect.bisect_left(self.occupied_keys, -top)
+        if j == len(self.occupied_keys) or self.occupied_keys[j] != -top:
+            return self.from_key(-top)
+
+        last = self.occupied_run(j)[1]
+        return self.from_key(min(self.occupied_keys[last] + 1, top))
+
+    def fit_line(self, x, y):
+        """Utility function
+        Least squares line through the points (x, y), computed as scipy.stats.linregress computes it.
+
+        :return: (slope, intercept)
+        """
+        (ssxm, ssxym, _, _) = np.cov(x, y, bias=True).flat
+        slope = ssxym / ssxm
+        return (slope, np.mean(y) - slope * np.mean(x))
+
+    def mode(self, values):
+        """Utility function
+        :return: the most common of values, the smallest one if several are equally common
+        """
+        counts = dd(int)
+        for v in values:
+            counts[v] += 1
+        return min(counts, key=lambda v: (-counts[v], v))
 
     def next_after(self, num, direction):
         """Utility function
@@ -543,7 +645,11 @@ class Player:
         :param direction: +1/-1 as the direction to move
         :return: the next floating number towards direction dir
         """
-        return round(num + direction * self.EPSILON, 5)
+        key = self.to_key(num)
+        if key is None:
+            # a number off the grid, e.g. from the opponent, is rounded onto it
+            return round(num + direction * self.EPSILON, 5)
+        return self.from_key(key + direction)
 
     def __repr__(self):
         """
@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+
+OVERALL = 'overall'
+# the score of the first player for each result of a TEST reply of the server
+REPLY_SCORES = {'player 1 won': 1.0, 'draw': 0.5, 'player 2 won': 0.0}
+
+
+class RatingLadder:
+    """Elo ratings of player modules, overall and per victory condition, updated game by game.
+
+    Every game updates the overall ratings of both modules, and the ratings of each module under the
+    victory condition it played, against the other module under its own condition. A win scores 1,
+    a draw 0.5 and a loss 0.
+
+    A module starts at the initial rating with a K factor of max_k that shrinks as it plays, down to
+    k, so a new variant settles near its place on the ladder within a few dozen games while the
+    ratings of established modules stay stable. The ladder is saved as JSON, so later runs rate new
+    variants against it without replaying earlier games; holding the established modules in fixed
+    while a new variant plays them places it without moving the rest of the ladder.
+
+    Attributes:
+        ratings (dict): ladder -> module -> [rating, games], where ladder is OVERALL or a condition
+        fixed (set): modules whose ratings are not updated
+    """
+
+    def __init__(self, path=None, k=16.0, initial=1500.0, max_k=64.0):
+        """
+        :param path: the JSON file of the ladder, loaded if it exists
+        :param k: the K factor of established modules
+        :param initial: the rating of a module in its first game
+        :param max_k: the K factor of a module in its first games
+        """
+        self.path = path
+        self.k = k
+        self.max_k = max_k
+        self.initial = initial
+        self.ratings = {}
+        self.fixed = set()
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.ratings = json.load(f)
+
+    def rating(self, module, condition=OVERALL):
+        return self.ratings.get(condition, {}).get(module, [self.initial, 0])[0]
+
+    def update_game(self, module1, condition1, module2, condition2, score):
+        """Rate one game.
+
+        :param score: the score of module1, 1 for a win, 0.5 for a draw and 0 for a loss
+        """
+        if module1 == module2:
+            return
+        self._update(OVERALL, module1, OVERALL, module2, score)
+        self._update(condition1, module1, condition2, module2, score)
+
+    def update(self, modules, victories, results):
+        """Rate the games of a BatchEngine or a tournament chunk.
+
+        :param modules: (module1, module2) names of the player modules, module1 moving first
+        :param victories: ((condition1, column1), (condition2, column2)) of each game
+        :param results: the results of the games, as in BatchEngine.score
+        """
+        (module1, module2) = modules
+        for (((condition1, _), (condition2, _)), res) in zip(victories, results):
+            self.update_game(module1, condition1, module2, condition2, (0.5, 1.0, 0.0)[res])
+
+    def update_reply(self, modules, reply):
+        """Rate the game of a TEST reply of the server.
+
+        :param modules: (module1, module2) names of the players of the TEST, module1 moving first
+        :param reply: the reply parsed as JSON, [syn, [p1, vt1, column1], [p2, vt2, column2], matrix, result,
+                      'finished']; replies without a known result are not rated
+        """
+        if reply[-2] in REPLY_SCORES:
+            self.update_game(modules[0], reply[1][1], modules[1], reply[2][1], REPLY_SCORES[reply[-2]])
+
+    def ladder(self, condition=OVERALL):
+        """
+        :return: list of (module, rating, games) by decreasing rating
+        """
+        entries = self.ratings.get(condition, {})
+        return sorted(((m, r, n) for (m, (r, n)) in entries.items()), key=lambda e: -e[1])
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.ratings, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def _entry(self, ladder, module):
+        return self.ratings.setdefault(ladder, {}).setdefault(module, [self.initial, 0])
+
+    def _k(self, games):
+        return max(self.k, min(self.max_k, 400.0 / (games + 1)))
+
+    def _update(self, ladder1, module1, ladder2, module2, score):
+        a = self._entry(ladder1, module1)
+        b = self._entry(ladder2, module2)
+        expected = 1 / (1 + 10 ** ((b[0] - a[0]) / 400))
+        (ka, kb) = (self._k(a[1]), self._k(b[1]))
+        if module1 not in self.fixed:
+            a[0] += ka * (score - expected)
+            a[1] += 1
+        if module2 not in self.fixed:
+            b[0] -= kb * (score - expected)
+            b[1] += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print a rating ladder.')
+    parser.add_argument('ladder', help='the JSON file of the ladder')
+    parser.add_argument('--condition', default=OVERALL, help='victory condition, or overall')
+    args = parser.parse_args()
+
+    ladder = RatingLadder(args.ladder)
+    print('module\trating\tgames')
+    for (module, rating, games) in ladder.ladder(args.condition):
+        print('{}\t{:.0f}\t{}'.format(module, rating, games))
@@ -0,0 +1,176 @@
+import numpy as np
+
+NUM_OF_TURNS = 10
+VICTORIES_CONDITIONS = ['Max', 'Min', 'Linear', 'Quadratic', 'ZeroM', 'SumNeg', 'SumPos']
+COLUMN_NAMES = ('A', 'B', 'C', 'D', 'E')
+
+
+def make_column_names(num_of_columns):
+    """
+    :param num_of_columns: the number of columns of the board
+    :return: a tuple of column names, single letters when there are at most 26 columns
+    """
+    if num_of_columns <= 26:
+        return tuple(chr(ord('A') + i) for i in range(num_of_columns))
+    return tuple('C{}'.format(i) for i in range(num_of_columns))
+
+
+def check_win_state(data, victory):
+    """Check whether a finished game meets a victory condition.
+
+    :param data: dict of column name -> list of floats (the full game matrix)
+    :param victory: (column, victory_condition) tuple
+    :return: True if the condition is met in the column, False otherwise
+    """
+    # scipy is imported when needed, so that processes which never judge a game (the sandbox workers) skip it
+    from scipy.stats import pearsonr
+
+    (player_col, v_condition) = victory
+    if v_condition == 'Max':
+        max_player = max(data[player_col])
+        max_all = 0
+        max_count = 1
+        for v in data.values():
+            col_max = max(v)
+            if max_all < col_max:
+                max_all = col_max
+                max_count = 1
+            elif max_all == col_max:
+                max_count += 1
+        return max_all == max_player and max_count == 1
+    elif v_condition == 'Min':
+        min_player = min(data[player_col])
+        min_all = 0
+        min_count = 1
+        for v in data.values():
+            col_min = min(v)
+            if min_all > col_min:
+                min_all = col_min
+                min_count = 1
+            elif min_all == col_min:
+                min_count += 1
+        return min_all == min_player and min_count == 1
+    elif v_condition == 'Linear':
+        (r, p) = pearsonr(data[player_col], range(len(data[player_col])))
+        return p <= 0.05 and r >= 0.9
+    elif v_condition == 'Quadratic':
+        a = np.array(data[player_col])
+        a = list(a*a)
+        (r, p) = pearsonr(a, range(len(a)))
+        return p <= 0.05 and r >= 0.9
+    elif v_condition == 'ZeroM':
+        return -0.000001 < np.mean(data[player_col]) < 0.000001
+    elif v_condition == 'SumNeg':
+        return np.sum(data[player_col]) < 0
+    elif v_condition == 'SumPos':
+        return np.sum(data[player_col]) > 0
+    else:
+        raise SystemError
+
+
+def check_win_states(board, conditions, columns):
+    """Check the victory conditions of a whole batch of finished games at once.
+
+    Gives the same verdicts as check_win_state game by game. Unique extremes are found by sorting
+    the column maxima/minima of each game, and the correlations of Linear and Quadratic are computed
+    in closed form (the same centred and normalised dot product as pearsonr) for all games together.
+
+    :param board: float array of shape (games, columns, rows) holding the game matrices
+    :param conditions: the victory condition name of each game
+    :param columns: the index of the victory column of each game
+    :return: bool array of shape (games,), True where the condition is met
+    """
+    board = np.asarray(board, dtype=float)
+    conditions = np.asarray(conditions)
+    columns = np.asarray(columns, dtype=int)
+    unknown = ~np.isin(conditions, VICTORIES_CONDITIONS)
+    if unknown.any():
+        raise SystemError
+    games = np.arange(board.shape[0])
+    wins = np.zeros(board.shape[0], dtype=bool)
+
+    for (v_condition, extreme) in (('Max', np.max), ('Min', np.min)):
+        idx = games[conditions == v_condition]
+        if idx.size:
+            wins[idx] = unique_extreme_wins(v_condition, extreme(board[idx], axis=2), columns[idx])
+
+    for v_condition in ('Linear', 'Quadratic'):
+        idx = games[conditions == v_condition]
+        if idx.size:
+            a = board[idx, columns[idx]]
+            if v_condition == 'Quadratic':
+                a = a * a
+            (r, p) = _pearsonr_rows(a)
+            with np.errstate(invalid='ignore'):
+                wins[idx] = (p <= 0.05) & (r >= 0.9)
+
+    idx = games[conditions == 'ZeroM']
+    if idx.size:
+        mean = np.mean(board[idx, columns[idx]], axis=1)
+        wins[idx] = (-0.000001 < mean) & (mean < 0.000001)
+    idx = games[conditions == 'SumNeg']
+    if idx.size:
+        wins[idx] = np.sum(board[idx, columns[idx]], axis=1) < 0
+    idx = games[conditions == 'SumPos']
+    if idx.size:
+        wins[idx] = np.sum(board[idx, columns[idx]], axis=1) > 0
+
+    return wins
+
+
+def unique_extreme_wins(v_condition, col_extreme, columns):
+    """The Max and Min rules of check_win_state, for a batch of games.
+
+    A player wins if its column holds the extreme of the whole matrix, that extreme is beyond 0 (the
+    value of row 0) and no other column reaches it.
+
+    :param v_condition: 'Max' or 'Min'
+    :param col_extreme: float array of shape (games, columns), the maximum of each column for Max, its
+                        minimum for Min
+    :param columns: the index of the victory column of each game
+    :return: bool array of shape (games,), True where the condition is met
+    """
+    beyond = np.greater if v_condition == 'Max' else np.less
+    ranked = np.sort(col_extreme, axis=1)
+    if v_condition == 'Max':
+        ranked = ranked[:, ::-1]
+    best = ranked[:, 0]
+    unique = beyond(best, ranked[:, 1]) if ranked.shape[1] > 1 else np.ones(len(best), dtype=bool)
+    return beyond(best, 0) & unique & (col_extreme[np.arange(len(best)), columns] == best)
+
+
+def _vecdot(a, b):
+    if hasattr(np, 'vecdot'):
+        return np.vecdot(a, b)
+    return np.einsum('ij,j->i', a, b)
+
+
+def _pearsonr_rows(a):
+    """Pearson correlation and two-sided p-value of each row of a against its row index."""
+    n = a.shape[1]
+    x = np.arange(n, dtype=float)
+    xm = x - np.mean(x)
+    xm = xm / (np.max(np.abs(xm)) * np.linalg.norm(xm / np.max(np.abs(xm))))
+    am = a - np.mean(a, axis=1, keepdims=True)
+    amax = np.max(np.abs(am), axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        norm = amax * np.linalg.norm(am / amax, axis=1, keepdims=True)
+        r = np.clip(_vecdot(am / norm, xm), -1.0, 1.0)
+    r[(a == a[:, :1]).all(axis=1)] = np.nan
+    return (r, pearson_pvalue(r, n))
+
+
+def pearson_pvalue(r, n):
+    """Two-sided p-value of Pearson correlations r computed from n samples, as in pearsonr.
+
+    :param r: array of correlation coefficients
+    :param n: number of samples
+    :return: array of p-values, nan where r is nan
+    """
+    from scipy.special import betainc
+
+    r = np.asarray(r, dtype=float)
+    if n == 2:
+        return np.where(np.isnan(r), np.nan, 1.0)
+    ab = n/2 - 1
+    return np.minimum(2 * betainc(ab, ab, 0.5 * (1 - np.abs(r))), 1.0)
@@ -0,0 +1,114 @@
+from batch_engine import BatchEngine
+import argparse
+import importlib
+import json
+import numpy as np
+import struct
+import warnings
+import zlib
+
+RECORD = struct.Struct('<I')
+
+
+def append_replays(path, players, victories, seeds, boards, column_names):
+    """Append games to a replay log.
+
+    Each game is one record: a 4 byte length, then the zlib compressed JSON header (seed, players,
+    victories, column names) and the float64 game matrix of shape (columns, rows).
+
+    :param path: the replay log file
+    :param players: (module1, module2) names of the player modules, module1 moving first
+    :param victories: ((condition1, column1), (condition2, column2)) of each game
+    :param seeds: the seed of each game, as given to BatchEngine
+    :param boards: float array of shape (games, columns, rows)
+    :param column_names: the column names of the board
+    """
+    with open(path, 'ab') as f:
+        for (victory, seed, board) in zip(victories, seeds, boards):
+            header = json.dumps({'seed': int(seed), 'players': list(players),
+                                 'victories': [list(v) for v in victory], 'column_names': list(column_names)})
+            data = zlib.compress(header.encode('utf-8') + b'\0' + np.ascontiguousarray(board, dtype='<f8').tobytes())
+            f.write(RECORD.pack(len(data)))
+            f.write(data)
+
+
+def append_engine_replays(path, engine, players):
+    """Append every game of a played BatchEngine to a replay log.
+
+    :param players: (module1, module2) names of the player modules of the engine
+    """
+    append_replays(path, players, engine.victories, engine.seeds, engine.board[:, :, :engine.length],
+                   engine.column_names)
+
+
+def iter_replays(path):
+    """
+    :return: an iterator over the records of a replay log, see read_replay
+    """
+    with open(path, 'rb') as f:
+        while True:
+            size = f.read(RECORD.size)
+            if len(size) < RECORD.size:
+                return
+            yield _decode(f.read(RECORD.unpack(size)[0]))
+
+
+def read_replay(path, index):
+    """Read one game of a replay log, skipping over the records before it without decoding them.
+
+    :param path: the replay log file
+    :param index: the position of the game in the log
+    :return: dict with seed, players, victories, column_names and board (float array (columns, rows))
+    """
+    with open(path, 'rb') as f:
+        for _ in range(index):
+            size = f.read(RECORD.size)
+            if len(size) < RECORD.size:
+                raise IndexError('replay log has only {} games'.format(_))
+            f.seek(RECORD.unpack(size)[0], 1)
+        size = f.read(RECORD.size)
+        if len(size) < RECORD.size:
+            raise IndexError('replay log has only {} games'.format(index))
+        return _decode(f.read(RECORD.unpack(size)[0]))
+
+
+def _decode(data):
+    (header, board) = zlib.decompress(data).split(b'\0', 1)
+    record = json.loads(header.decode('utf-8'))
+    record['victories'] = tuple(tuple(v) for v in record['victories'])
+    record['board'] = np.frombuffer(board, dtype='<f8').reshape(len(record['column_names']), -1)
+    return record
+
+
+def replay_game(record):
+    """Play a recorded game again with the same players, seed, conditions and columns.
+
+    :param record: a record from read_replay
+    :return: (engine, identical) with the engine of the replayed game and whether its matrix is
+             bit for bit the recorded one
+    """
+    classes = [importlib.import_module(m).Player for m in record['players']]
+    num_of_turns = (record['board'].shape[1] - 1) // 2
+    engine = BatchEngine(classes[0], classes[1], [record['victories']], num_of_turns=num_of_turns,
+                         column_names=record['column_names'], seeds=[record['seed']])
+    engine.play()
+    return (engine, engine.board[0].tobytes() == record['board'].tobytes())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay one game of a replay log.')
+    parser.add_argument('log', help='replay log file')
+    parser.add_argument('index', type=int, help='position of the game in the log')
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    record = read_replay(args.log, args.index)
+    (engine, identical) = replay_game(record)
+    print('seed: {}'.format(record['seed']))
+    for (seat, (module, (condition, column))) in enumerate(zip(record['players'], record['victories'])):
+        print('player {}: {} ({}, {})'.format(seat + 1, module, condition, column))
+    print(engine.game_state(0))
+    if engine.errors:
+        print('errors: {}'.format(engine.errors))
+    print('result: {}'.format(('draw', 'player 1 won', 'player 2 won')[engine.score()[0]]))
+    print('identical to the recorded game: {}'.format(identical))
@@ -0,0 +1,107 @@
+from send_utility import source_hash
+import hashlib
+import io
+import json
+import sqlite3
+import time
+import tokenize
+
+
+def test_key(source1, source2, vt1, vt2, seat):
+    """
+    :param source1: source of the player moving first
+    :param source2: source of the player moving second
+    :param seat: 0 if the tested player moves first, 1 otherwise
+    :return: the content address of a TEST: unchanged sources and conditions give the same key
+    """
+    parts = [source_hash(s) for s in (source1, source2)] + [vt1, vt2, str(seat)]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+def uses_randomness(source):
+    """Whether a player source draws random numbers, so that its games are samples of a distribution.
+
+    A source does if its code names random or rng, as a module, a name or an attribute; comments and
+    strings do not count. A source that does not tokenize is taken to be randomized.
+    """
+    try:
+        return any(t.type == tokenize.NAME and t.string in ('random', 'rng')
+                   for t in tokenize.generate_tokens(io.StringIO(source).readline))
+    except (tokenize.TokenError, SyntaxError):
+        return True
+
+
+class ResultCache:
+    """A persistent cache of TEST replies in an sqlite3 file, keyed by test_key.
+
+    A key holds up to the number of samples asked for: one for players that play deterministically,
+    several for randomized ones, whose games are draws from a distribution. Keys are evicted least
+    recently used first once the stored replies exceed max_bytes.
+    """
+
+    def __init__(self, path, max_bytes=256 << 20):
+        """
+        :param path: the sqlite3 file, created if it does not exist
+        :param max_bytes: the largest total size of the stored replies
+        """
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, last_used REAL, size INTEGER);
+            CREATE TABLE IF NOT EXISTS samples (key TEXT, added REAL, reply TEXT);
+            CREATE INDEX IF NOT EXISTS samples_key ON samples (key);
+            CREATE INDEX IF NOT EXISTS keys_last_used ON keys (last_used);
+        ''')
+
+    def get(self, key):
+        """
+        :return: the replies stored under key, oldest first, parsed as JSON
+        """
+        rows = self.db.execute('SELECT reply FROM samples WHERE key = ? ORDER BY rowid', (key,)).fetchall()
+        if rows:
+            with self.db:
+                self.db.execute('UPDATE keys SET last_used = ? WHERE key = ?', (time.time(), key))
+        return [json.loads(r[0]) for r in rows]
+
+    def add(self, key, reply, samples=1):
+        """Store one more reply under key, dropping the oldest beyond samples.
+
+        :param reply: the reply parsed as JSON
+        """
+        text = json.dumps(reply)
+        now = time.time()
+        with self.db:
+            self.db.execute('INSERT INTO samples VALUES (?, ?, ?)', (key, now, text))
+            self.db.execute('DELETE FROM samples WHERE key = ? AND rowid NOT IN '
+                            '(SELECT rowid FROM samples WHERE key = ? ORDER BY rowid DESC LIMIT ?)',
+                            (key, key, samples))
+            self.db.execute('INSERT OR REPLACE INTO keys VALUES (?, ?, '
+                            '(SELECT SUM(LENGTH(reply)) FROM samples WHERE key = ?))', (key, now, key))
+        self.evict()
+
+    def refresh(self, key):
+        """Forget the replies of key, so that they are asked for again."""
+        with self.db:
+            self.db.execute('DELETE FROM samples WHERE key = ?', (key,))
+            self.db.execute('DELETE FROM keys WHERE key = ?', (key,))
+
+    def size(self):
+        return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM keys').fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used keys until the replies fit in max_bytes."""
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        dropped = []
+        for (key, size) in self.db.execute('SELECT key, size FROM keys ORDER BY last_used'):
+            if excess <= 0:
+                break
+            dropped.append(key)
+            excess -= size
+        with self.db:
+            self.db.executemany('DELETE FROM samples WHERE key = ?', [(k,) for k in dropped])
+            self.db.executemany('DELETE FROM keys WHERE key = ?', [(k,) for k in dropped])
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,208 @@
+from referee import COLUMN_NAMES, NUM_OF_TURNS
+import argparse
+import json
+import numpy as np
+import os
+
+# fixed width fields of a game record; module and condition fields hold codes into the string tables of the store
+FIELDS = [('module_a', '<u2'), ('module_b', '<u2'), ('condition_a', '<u1'), ('condition_b', '<u1'),
+          ('column_a', '<u2'), ('column_b', '<u2'), ('seat', '<u1'), ('winner', '<u1'), ('seed', '<i8')]
+STRING_FIELDS = {'module_a': 'module', 'module_b': 'module', 'condition_a': 'condition', 'condition_b': 'condition'}
+
+
+class ResultStore:
+    """An append-only columnar store of game results, read through memory maps.
+
+    A store is a directory with one binary file per field of FIELDS, one file with the float64 game
+    matrices, and meta.json with the board shape, the string tables of module and condition names and
+    the number of committed games.
+    Results are always stored from the point of view of the pairing (module_a, module_b), with the
+    module names in alphabetical order: seat is 0 if module_a moved first and 1 otherwise, and winner
+    is 0 for a draw, 1 if module_a won and 2 if module_b won. The matrix of a game keeps the board as
+    played, in move order.
+
+    Records are appended field by field and committed by rewriting meta.json once every file has been
+    flushed. Opening a store truncates the files to the committed games, so a write interrupted half
+    way is dropped and later records stay aligned.
+    """
+
+    def __init__(self, path, column_names=COLUMN_NAMES, num_of_turns=NUM_OF_TURNS):
+        """
+        :param path: the store directory, created if it does not exist
+        :param column_names: the column names of the board, for a new store
+        :param num_of_turns: the number of turns of a game, for a new store
+        """
+        self.path = path
+        meta = os.path.join(path, 'meta.json')
+        if os.path.exists(meta):
+            with open(meta, 'r') as f:
+                self.meta = json.load(f)
+            if 'games' not in self.meta:
+                # stores written before the count was kept: the complete records are those of the shortest file
+                self.meta['games'] = self._complete_games()
+                self._write_meta()
+            self._truncate()
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.meta = {'column_names': list(column_names), 'rows': 2*num_of_turns+1,
+                         'strings': {'module': [], 'condition': []}, 'games': 0}
+            self._write_meta()
+        self._codes = {k: {s: i for (i, s) in enumerate(v)} for (k, v) in self.meta['strings'].items()}
+
+    @property
+    def matrix_shape(self):
+        return (len(self.meta['column_names']), self.meta['rows'])
+
+    def __len__(self):
+        return self.meta['games']
+
+    def append(self, modules, victories, seeds, results, boards):
+        """Append the games of one pairing, played by module1 moving first.
+
+        :param modules: (module1, module2) names of the player modules
+        :param victories: ((condition1, column1), (condition2, column2)) of each game
+        :param seeds: the seed of each game, or None
+        :param results: the results of the games, as in BatchEngine.score
+        :param boards: float array of shape (games, columns, rows)
+        """
+        n = len(victories)
+        if n == 0:
+            return
+        boards = np.asarray(boards, dtype='<f8')
+        if boards.shape != (n,) + self.matrix_shape:
+            raise ValueError('boards of shape {} do not match {} games of shape {}'.format(
+                boards.shape, n, self.matrix_shape))
+        (module1, module2) = modules
+        swap = module1 > module2
+        column_index = {c: i for (i, c) in enumerate(self.meta['column_names'])}
+        c1 = [self._code('condition', v[0][0]) for v in victories]
+        c2 = [self._code('condition', v[1][0]) for v in victories]
+        col1 = [column_index[v[0][1]] for v in victories]
+        col2 = [column_index[v[1][1]] for v in victories]
+        results = np.asarray(results)
+        if swap:
+            (module1, module2, c1, c2, col1, col2) = (module2, module1, c2, c1, col2, col1)
+            results = np.array([0, 2, 1])[results]
+        values = {'module_a': np.full(n, self._code('module', module1)),
+                  'module_b': np.full(n, self._code('module', module2)),
+                  'condition_a': c1, 'condition_b': c2, 'column_a': col1, 'column_b': col2,
+                  'seat': np.full(n, int(swap)), 'winner': results,
+                  'seed': np.full(n, -1) if seeds is None else seeds}
+        for (name, dtype) in FIELDS:
+            self._write(name, np.asarray(values[name]).astype(dtype))
+        self._write('matrix', boards)
+        self.meta['games'] += n
+        self._write_meta()
+
+    def append_engine(self, engine, modules):
+        """Append every game of a played BatchEngine.
+
+        :param modules: (module1, module2) names of the player modules of the engine
+        """
+        self.append(modules, engine.victories, engine.seeds, engine.score(), engine.board[:, :, :engine.length])
+
+    def field(self, name):
+        """
+        :param name: a field of FIELDS, or 'matrix'
+        :return: a read-only memory map of the field, of shape (games,) or (games, columns, rows)
+        """
+        n = len(self)
+        if name == 'matrix':
+            return np.memmap(self._file(name), dtype='<f8', mode='r', shape=(n,) + self.matrix_shape) if n else \
+                np.zeros((0,) + self.matrix_shape)
+        dtype = dict(FIELDS)[name]
+        return np.memmap(self._file(name), dtype=dtype, mode='r', shape=(n,)) if n else np.zeros(0, dtype=dtype)
+
+    def strings(self, name):
+        """
+        :param name: a field of FIELDS
+        :return: the string table of the field, or None for numeric fields
+        """
+        return self.meta['strings'][STRING_FIELDS[name]] if name in STRING_FIELDS else None
+
+    def win_rates(self, by, chunk_size=1 << 20):
+        """Count the wins, draws and losses of module_a for every group of games.
+
+        The fields are read chunk by chunk through their memory maps, so a store of any size is
+        aggregated in constant memory.
+
+        :param by: the fields to group by
+        :param chunk_size: number of games per chunk
+        :return: dict of group -> [games, module_a wins, draws, module_b wins], where a group is the
+                 tuple of the values of the by fields, strings for the module and condition fields
+        """
+        fields = [self.field(name) for name in by]
+        winner = self.field('winner')
+        # values are shifted by the minimum of their field, as seed holds -1 for unseeded games
+        offset = [int(f.min()) if len(f) else 0 for f in fields]
+        radix = [int(f.max()) - o + 1 if len(f) else 1 for (f, o) in zip(fields, offset)]
+        counts = {}
+        for start in range(0, len(winner), chunk_size):
+            key = np.zeros(min(chunk_size, len(winner) - start), dtype=np.int64)
+            for (f, o, r) in zip(fields, offset, radix):
+                key = key * r + (f[start:start+chunk_size].astype(np.int64) - o)
+            (groups, inverse) = np.unique(key, return_inverse=True)
+            cells = inverse.ravel() * 3 + winner[start:start+chunk_size]
+            table = np.bincount(cells, minlength=3 * len(groups)).reshape(-1, 3)
+            for (g, row) in zip(groups.tolist(), table):
+                counts[g] = counts.get(g, 0) + row
+
+        result = {}
+        for (g, row) in counts.items():
+            values = []
+            for (name, o, r) in reversed(list(zip(by, offset, radix))):
+                (g, v) = divmod(g, r)
+                v += o
+                values.append(self.strings(name)[v] if name in STRING_FIELDS else v)
+            result[tuple(reversed(values))] = [int(row.sum()), int(row[1]), int(row[0]), int(row[2])]
+        return result
+
+    def _code(self, table, value):
+        codes = self._codes[table]
+        if value not in codes:
+            codes[value] = len(codes)
+            self.meta['strings'][table].append(value)
+            self._write_meta()
+        return codes[value]
+
+    def _write(self, name, array):
+        with open(self._file(name), 'ab') as f:
+            f.write(np.ascontiguousarray(array).tobytes())
+
+    def _complete_games(self):
+        sizes = [os.path.getsize(self._file(name)) // np.dtype(dtype).itemsize
+                 for (name, dtype) in FIELDS if os.path.exists(self._file(name))]
+        if len(sizes) < len(FIELDS) or not os.path.exists(self._file('matrix')):
+            return 0
+        matrices = os.path.getsize(self._file('matrix')) // (8 * self.matrix_shape[0] * self.matrix_shape[1])
+        return min(sizes + [matrices])
+
+    def _truncate(self):
+        n = self.meta['games']
+        for (name, dtype) in FIELDS + [('matrix', '<f8')]:
+            size = n * np.dtype(dtype).itemsize * (np.prod(self.matrix_shape) if name == 'matrix' else 1)
+            if os.path.exists(self._file(name)) and os.path.getsize(self._file(name)) > size:
+                os.truncate(self._file(name), int(size))
+
+    def _write_meta(self):
+        tmp = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, 'meta.json'))
+
+    def _file(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Win rates of module_a by any grouping of a result store.')
+    parser.add_argument('store', help='result store directory')
+    parser.add_argument('--by', nargs='+', default=['module_a', 'module_b'], choices=[f for (f, _) in FIELDS])
+    args = parser.parse_args()
+
+    store = ResultStore(args.store)
+    print('{} games'.format(len(store)))
+    print('\t'.join(args.by + ['games', 'won', 'draw', 'lost', 'win rate']))
+    for (group, (games, won, draw, lost)) in sorted(store.win_rates(args.by).items()):
+        print('\t'.join([str(v) for v in group] + [str(games), str(won), str(draw), str(lost),
+                                                   '{:.3f}'.format(won / games)]))
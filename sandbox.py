@@ -0,0 +1,364 @@
+from batch_engine import new_player
+from collections import OrderedDict
+from send_utility import source_hash
+import numpy as np
+import os
+import select
+import struct
+import subprocess
+import sys
+import time
+import types
+
+LOAD, NEW, TURN, END, DROP = range(5)
+OK, ERR, TIMEOUT = range(3)
+
+REQUEST = struct.Struct('<BII')
+REPLY = struct.Struct('<BI')
+ROWS = struct.Struct('<I')
+
+
+class PlayerError(Exception):
+    """The player code raised an exception, or its worker failed, while taking a turn."""
+
+
+class TurnTimeout(PlayerError):
+    """The player exceeded the CPU time or wall clock limit of a turn."""
+
+
+class Worker:
+    """The parent's handle on one worker process."""
+
+    def __init__(self, memory, cpu_time):
+        self.memory = memory
+        self.cpu_time = cpu_time
+        # BLAS libraries reserve address space for every thread they start, which a worker's RLIMIT_AS
+        # would count; the players do not need threaded linear algebra
+        env = dict(os.environ, OPENBLAS_NUM_THREADS='1', OMP_NUM_THREADS='1', MKL_NUM_THREADS='1')
+        self.proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker', str(memory),
+                                      str(cpu_time)],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+                                     cwd=os.path.dirname(os.path.abspath(__file__)))
+        # keys of the player classes loaded in the worker, least recently used first
+        self.loaded = OrderedDict()
+        self.games = 0
+        self.ready = False
+
+    def request(self, op, game, payload=b'', deadline=None):
+        """Send a frame and wait for its reply.
+
+        :param deadline: time.monotonic() by which the reply must have arrived
+        :return: (status, payload) of the reply
+        """
+        if not self.ready:
+            # the worker announces itself once its imports are done, which is not part of any turn
+            self._read(REPLY.size, None)
+            self.ready = True
+        self.proc.stdin.write(REQUEST.pack(op, game, len(payload)))
+        self.proc.stdin.write(payload)
+        self.proc.stdin.flush()
+        (status, size) = REPLY.unpack(self._read(REPLY.size, deadline))
+        return (status, self._read(size, deadline))
+
+    def _read(self, size, deadline):
+        fd = self.proc.stdout.fileno()
+        chunks = []
+        while size:
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or not select.select([fd], [], [], timeout)[0]:
+                    raise TurnTimeout('no reply before the turn deadline')
+            chunk = os.read(fd, size)
+            if not chunk:
+                raise PlayerError('worker exited')
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def kill(self):
+        self.proc.kill()
+        self.proc.wait()
+
+
+class SandboxPool:
+    """A pool of long-lived worker processes that run player code.
+
+    Player sources are compiled once per worker and stay loaded, so numpy and the player
+    module are not imported again for every game. Each game's player lives in one worker and is
+    driven over a binary channel on the worker's stdin/stdout: every turn sends only the rows
+    appended since the player's previous turn, as float64, and receives the player's row back.
+    Frames from the parent are a '<BII' header (opcode, game id, payload length) and the payload,
+    replies a '<BI' header (status, payload length) and the payload.
+
+    Creating a player (which runs its __init__) and each take_turn run under a CPU time limit,
+    enforced in the worker with a profiling timer, and every request to a worker under a wall clock
+    deadline enforced by the parent, which kills and restarts a worker that does not answer in time.
+    Only the game whose request failed is charged with the failure: the other games of a restarted
+    worker are moved to a live worker by replaying their turns, see RemotePlayer. Workers run with a
+    cap on their address space. This contains slow, hanging and memory hungry players; it does not
+    restrict what their code may do with files or the network.
+
+    Attributes:
+        workers (list): the Worker handles
+        turn_cpu_time (float): CPU seconds a player may use in one take_turn
+        turn_wall_time (float): seconds the parent waits for a turn before restarting the worker
+        memory (int): address space (RLIMIT_AS) limit of each worker in bytes, 0 for no limit. It counts
+                      virtual memory, not resident memory: numpy alone maps a few hundred MB, which is
+                      why BLAS is kept to one thread in the workers
+        max_loaded (int): the number of player classes a worker keeps loaded, least recently used
+                          ones are dropped first
+    """
+
+    def __init__(self, processes=1, turn_cpu_time=1.0, turn_wall_time=5.0, memory=2 << 30, max_loaded=64):
+        self.turn_cpu_time = turn_cpu_time
+        self.turn_wall_time = turn_wall_time
+        self.memory = memory
+        self.max_loaded = max_loaded
+        self.workers = [Worker(memory, turn_cpu_time) for _ in range(processes)]
+        self._next_game = 0
+
+    def player_class(self, source, name='player'):
+        """Make a Player class whose instances play in the pool.
+
+        :param source: the source code of a player module defining a Player class
+        :param name: the module name the source is loaded under
+        :return: a class with the take_turn interface of the player
+        """
+        pool = self
+
+        class SandboxPlayer(RemotePlayer):
+            def __init__(self):
+                super().__init__(pool, name, source)
+
+        SandboxPlayer.__name__ = SandboxPlayer.__qualname__ = 'Sandbox_{}'.format(name)
+        return SandboxPlayer
+
+    def start_game(self, name, source, column_names, num_of_turns=None, rng=None):
+        """Create a player of the given source on the least busy worker.
+
+        :param num_of_turns: set as NUM_OF_TURNS on players that have it
+        :param rng: a np.random.RandomState whose state is given as rng to players that have it
+        :return: (worker, game id)
+        """
+        worker = min(self.workers, key=lambda w: w.games)
+        key = source_hash(source)
+        if key in worker.loaded:
+            worker.loaded.move_to_end(key)
+        else:
+            while len(worker.loaded) >= self.max_loaded:
+                (old, _) = worker.loaded.popitem(last=False)
+                self._check(worker, self._request(worker, DROP, 0, old.encode('utf-8')))
+            self._check(worker, self._request(worker, LOAD, 0, _join(key, name, source)))
+            worker.loaded[key] = True
+        self._next_game += 1
+        turns = str(num_of_turns or '')
+        state = _encode_rng_state(rng) if rng is not None else ''
+        self._check(worker, self._request(worker, NEW, self._next_game, _join(key, turns, state, *column_names)))
+        worker.games += 1
+        return (worker, self._next_game)
+
+    def take_turn(self, worker, game, rows, victory):
+        """Play one turn of a game on its worker.
+
+        :param rows: float64 array (columns, new rows) of the rows appended since the last turn
+        :param victory: (victory condition, victory column)
+        :return: float64 array of the player's values, one per column
+        """
+        payload = ROWS.pack(rows.shape[1]) + _join(*victory) + b'\0' + rows.tobytes()
+        reply = self._request(worker, TURN, game, payload)
+        return np.frombuffer(self._check(worker, reply), dtype=np.float64)
+
+    def end_game(self, worker, game):
+        if worker in self.workers:
+            worker.games -= 1
+            self._check(worker, self._request(worker, END, game, b''))
+
+    def close(self):
+        for w in self.workers:
+            w.kill()
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, worker, op, game, payload):
+        deadline = time.monotonic() + self.turn_wall_time
+        try:
+            return worker.request(op, game, payload, deadline=deadline)
+        except PlayerError:
+            self._restart(worker)
+            raise
+        except OSError as e:
+            self._restart(worker)
+            raise PlayerError('worker failed: {!r}'.format(e))
+
+    def _check(self, worker, reply):
+        (status, payload) = reply
+        if status == OK:
+            return payload
+        if status == TIMEOUT:
+            raise TurnTimeout(payload.decode('utf-8'))
+        if worker.proc.poll() is not None:
+            self._restart(worker)
+        raise PlayerError(payload.decode('utf-8'))
+
+    def _restart(self, worker):
+        # the other games of the worker are replayed on a live worker by their RemotePlayer
+        worker.kill()
+        self.workers[self.workers.index(worker)] = Worker(self.memory, self.turn_cpu_time)
+
+
+class RemotePlayer:
+    """A player whose take_turn runs in a SandboxPool worker.
+
+    The player remembers which rows it was sent in each of its turns. When its worker has been
+    restarted because of another game, it starts over on a live worker, from the same rng state, and
+    replays those turns to rebuild its state before playing the current one.
+    """
+    NUM_OF_TURNS = None
+    rng = None
+
+    def __init__(self, pool, name, source):
+        self._pool = pool
+        self._name = name
+        self._source = source
+        self._game = None
+        self._sent = 0
+        self._turns = []
+
+    def take_turn(self, data, victory):
+        columns = list(data)
+        if self._game is None or self._game[0] not in self._pool.workers:
+            self._start(data, columns)
+        (worker, game) = self._game
+        rows = np.array([data[c][self._sent:] for c in columns], dtype=np.float64).reshape(len(columns), -1)
+        self._turns.append((self._sent, len(data[columns[0]]), victory))
+        self._sent = len(data[columns[0]])
+        values = self._pool.take_turn(worker, game, rows, victory)
+        return dict(zip(columns, values.tolist()))
+
+    def _start(self, data, columns):
+        # a NumPy RandomState given as rng is never advanced in the parent, so it still holds the initial state
+        self._game = self._pool.start_game(self._name, self._source, columns, self.NUM_OF_TURNS, self.rng)
+        for (begin, end, victory) in self._turns:
+            rows = np.array([data[c][begin:end] for c in columns], dtype=np.float64).reshape(len(columns), -1)
+            self._pool.take_turn(*self._game, rows, victory)
+
+    def __del__(self):
+        try:
+            if self._game is not None:
+                self._pool.end_game(*self._game)
+        except Exception:
+            pass
+
+
+def _join(*parts):
+    return b'\0'.join(p if isinstance(p, bytes) else p.encode('utf-8') for p in parts)
+
+
+def _encode_rng_state(rng):
+    (name, keys, pos, has_gauss, cached_gaussian) = rng.get_state()
+    return ':'.join((keys.astype('<u4').tobytes().hex(), str(pos), str(has_gauss), float(cached_gaussian).hex()))
+
+
+def _decode_rng_state(text):
+    (keys, pos, has_gauss, cached_gaussian) = text.split(':')
+    rng = np.random.RandomState()
+    rng.set_state(('MT19937', np.frombuffer(bytes.fromhex(keys), dtype='<u4'), int(pos), int(has_gauss),
+                   float.fromhex(cached_gaussian)))
+    return rng
+
+
+class _CpuTimeExceeded(BaseException):
+    pass
+
+
+def _on_cpu_time(signum, frame):
+    raise _CpuTimeExceeded()
+
+
+def worker_main(memory, cpu_time):
+    """Serve frames from the parent on stdin/stdout until stdin is closed."""
+    import signal
+    import warnings
+    try:
+        import resource
+        if memory:
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    except (ImportError, ValueError):
+        pass
+    warnings.simplefilter('ignore')
+    # keep the channel on private descriptors so that players printing cannot corrupt it
+    channel_in = os.fdopen(os.dup(0), 'rb')
+    channel_out = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    signal.signal(signal.SIGPROF, _on_cpu_time)
+
+    classes = {}
+    games = {}
+
+    def reply(status, payload=b''):
+        channel_out.write(REPLY.pack(status, len(payload)))
+        channel_out.write(payload)
+        channel_out.flush()
+
+    reply(OK)
+
+    while True:
+        header = channel_in.read(REQUEST.size)
+        if len(header) < REQUEST.size:
+            return
+        (op, game, size) = REQUEST.unpack(header)
+        payload = channel_in.read(size)
+        try:
+            if op == LOAD:
+                (key, name, source) = payload.split(b'\0', 2)
+                module = types.ModuleType(name.decode('utf-8'))
+                exec(compile(source.decode('utf-8'), name.decode('utf-8') + '.py', 'exec'), module.__dict__)
+                classes[key.decode('utf-8')] = module.Player
+                reply(OK)
+            elif op == NEW:
+                (key, turns, state, *columns) = payload.decode('utf-8').split('\0')
+                signal.setitimer(signal.ITIMER_PROF, cpu_time)
+                try:
+                    player = new_player(classes[key])
+                finally:
+                    signal.setitimer(signal.ITIMER_PROF, 0)
+                if turns and hasattr(player, 'NUM_OF_TURNS'):
+                    player.NUM_OF_TURNS = int(turns)
+                if state and hasattr(player, 'rng'):
+                    player.rng = _decode_rng_state(state)
+                games[game] = (player, {c: [] for c in columns})
+                reply(OK)
+            elif op == TURN:
+                (player, data) = games[game]
+                (n,) = ROWS.unpack_from(payload)
+                (condition, column, rows) = payload[ROWS.size:].split(b'\0', 2)
+                rows = np.frombuffer(rows, dtype=np.float64).reshape(len(data), n)
+                for (values, new) in zip(data.values(), rows.tolist()):
+                    values.extend(new)
+                signal.setitimer(signal.ITIMER_PROF, cpu_time)
+                try:
+                    turn_data = player.take_turn(data, (condition.decode('utf-8'), column.decode('utf-8')))
+                finally:
+                    signal.setitimer(signal.ITIMER_PROF, 0)
+                reply(OK, np.array([turn_data[c] for c in data], dtype=np.float64).tobytes())
+            elif op == END:
+                games.pop(game, None)
+                reply(OK)
+            elif op == DROP:
+                classes.pop(payload.decode('utf-8'), None)
+                reply(OK)
+        except _CpuTimeExceeded:
+            reply(TIMEOUT, b'turn CPU time limit exceeded')
+        except BaseException as e:
+            reply(ERR, repr(e).encode('utf-8'))
+
+
+if __name__ == '__main__' and sys.argv[1:2] == ['--worker']:
+    worker_main(int(sys.argv[2]), float(sys.argv[3]))
@@ -0,0 +1,161 @@
+from async_client import send_async
+from collections import deque
+from send_utility import HOST, PORT
+import asyncio
+import random
+import re
+import time
+
+
+class LatencyWindow:
+    """The latencies of the last size successful requests of one command."""
+
+    def __init__(self, size=256):
+        self.latencies = deque(maxlen=size)
+
+    def record(self, seconds):
+        self.latencies.append(seconds)
+
+    def percentile(self, p):
+        """
+        :return: the p-th percentile of the window, or None while it holds too few latencies to say
+        """
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class _AttemptFailed(Exception):
+    """Every attempt of a hedged send failed; the error of the last one is the cause."""
+
+
+class RequestScheduler:
+    """Sends commands with a deadline, hedged duplicates and retries with backoff.
+
+    Every request must be answered before its deadline or raises TimeoutError. An attempt that is
+    not answered within the hedge_percentile latency of its command so far gets a duplicate sent
+    alongside it, and another after each further threshold up to max_hedges; the first reply wins.
+    The hedge threshold follows the latencies the
+    scheduler observes, so it adapts as the server speeds up or slows down. An attempt that fails
+    (connection refused or reset, malformed reply) is retried after an exponential backoff with full
+    jitter, as long as the deadline allows.
+
+    Hedging and retrying send a command more than once, which the protocol tolerates: TEST and REG
+    have no side effects on the server's state, ADD replaces and DEL of a deleted name is a no-op.
+    Every attempt, duplicates included, takes one of max_in_flight slots, so hedging never puts more
+    commands in flight than that, and a duplicate is only sent while a slot is free.
+
+    Attributes:
+        windows (dict): cmd -> LatencyWindow of its successful requests
+        hedged (int): number of duplicates sent
+        retried (int): number of attempts retried after a failure
+    """
+
+    def __init__(self, host=HOST, port=PORT, deadline=120.0, hedge_percentile=95, hedge_after=10.0, max_hedges=2,
+                 max_attempts=5, base_backoff=0.1, max_backoff=5.0, max_in_flight=None):
+        """
+        :param deadline: seconds a request may take, over all its attempts
+        :param hedge_percentile: latency percentile after which a duplicate is sent, None not to hedge
+        :param hedge_after: seconds after which a duplicate is sent while a command has too few
+                            latencies for a percentile
+        :param max_hedges: the largest number of duplicates of one attempt, each sent one threshold after
+                           the previous
+        :param max_attempts: number of failed attempts after which a request gives up
+        :param base_backoff: the backoff before the first retry, doubling with every retry
+        :param max_backoff: the largest backoff
+        :param max_in_flight: the largest number of attempts in flight at once, None for no limit
+        """
+        self.host = host
+        self.port = port
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_after = hedge_after
+        self.max_hedges = max_hedges
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_in_flight = max_in_flight
+        # made on first use, inside the event loop that runs the requests
+        self._slots = None
+        self.windows = {}
+        self.hedged = 0
+        self.retried = 0
+
+    async def send(self, js, host=None, port=None):
+        """Send the json string js and wait for its reply, as async_client.send_async.
+
+        :return: the reply parsed as JSON
+        """
+        match = re.match(r'\{"cmd": "(\w+)"', js)
+        cmd = match.group(1) if match else ''
+        window = self.windows.setdefault(cmd, LatencyWindow())
+        if self._slots is None and self.max_in_flight is not None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        (host, port) = (host or self.host, port or self.port)
+        end = time.monotonic() + self.deadline
+        failures = 0
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError('no reply to {} within {}s'.format(cmd, self.deadline))
+            try:
+                return await asyncio.wait_for(self._hedged(js, host, port, window), remaining)
+            except asyncio.TimeoutError:
+                # only the deadline of wait_for gets here, a timed out attempt is an _AttemptFailed
+                raise TimeoutError('no reply to {} within {}s'.format(cmd, self.deadline))
+            except _AttemptFailed as e:
+                failures += 1
+                if failures >= self.max_attempts:
+                    raise e.__cause__
+            self.retried += 1
+            backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** (failures - 1)))
+            await asyncio.sleep(min(backoff, max(0.0, end - time.monotonic())))
+
+    async def _hedged(self, js, host, port, window):
+        # the first attempt that succeeds wins; the hedge goes out once the first is slower than usual
+        async def attempt():
+            if self._slots is None:
+                return await timed()
+            async with self._slots:
+                return await timed()
+
+        async def timed():
+            start = time.monotonic()
+            reply = await send_async(js, host, port)
+            window.record(time.monotonic() - start)
+            return reply
+
+        tasks = [asyncio.ensure_future(attempt())]
+        hedges = 0
+        threshold = None
+        if self.hedge_percentile is not None:
+            threshold = window.percentile(self.hedge_percentile)
+            if threshold is None:
+                threshold = self.hedge_after
+        try:
+            while True:
+                timeout = threshold if threshold is not None and hedges < self.max_hedges else None
+                (done, _) = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if self._slots is not None and self._slots.locked():
+                        # duplicates only use spare slots, never the ones first attempts wait for
+                        continue
+                    self.hedged += 1
+                    hedges += 1
+                    tasks.append(asyncio.ensure_future(attempt()))
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                tasks = [t for t in tasks if t not in done]
+                if not tasks:
+                    # every attempt failed; hand the failure to the retry loop, apart from the deadline's own
+                    # TimeoutError, which a connect timing out would otherwise be taken for
+                    error = done.pop().exception()
+                    if isinstance(error, (OSError, EOFError, ValueError, asyncio.LimitOverrunError)):
+                        raise _AttemptFailed() from error
+                    raise error
+        finally:
+            for task in tasks:
+                task.cancel()
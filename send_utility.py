@@ -1,16 +1,264 @@
+import hashlib
+import json
+import os
+import select
 import socket
 
+# GAME_SERVER_HOST=127.0.0.1 points the clients at a local server.py
+HOST = os.environ.get('GAME_SERVER_HOST', '128.250.106.25')
+PORT = int(os.environ.get('GAME_SERVER_PORT', 5002))
+# the replies of the server start with 8 characters before their JSON
+REPLY_PREFIX = 8
+# seconds send_to_server waits on the server before raising socket.timeout instead of blocking forever
+REQUEST_TIMEOUT = 120.0
+
+
+def source_hash(source):
+    """
+    :return: the hash a source is registered under with REG, cached under and loaded under in the sandbox
+             workers, its sha256 hex digest
+    """
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+class FrameReader:
+    """Reads \\n terminated frames from a socket into one reusable buffer.
+
+    Data is received with recv_into straight into a bytearray that doubles when a frame does not
+    fit, and only the newly received bytes are searched for the terminator. A frame is handed out
+    as a memoryview of the buffer, valid until the next read, so it is decoded once and never copied
+    on the way. Bytes past the terminator stay in the buffer for the next frame.
+    """
+
+    def __init__(self, sock, size=65536):
+        self.sock = sock
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def read_frame(self):
+        """
+        :return: a memoryview of the next frame including its terminator, or None if the connection
+                 was closed before any of it arrived
+        """
+        if self.start == self.end:
+            self.start = self.end = 0
+        scanned = self.start
+        while True:
+            i = self.buffer.find(b'\n', scanned, self.end)
+            if i >= 0:
+                frame = self.view[self.start:i + 1]
+                self.start = i + 1
+                return frame
+            scanned = self.end
+            if self.end == len(self.buffer):
+                self._make_room()
+                scanned -= self.start
+                self.end -= self.start
+                self.start = 0
+            n = self.sock.recv_into(self.view[self.end:])
+            if n == 0:
+                if self.end > self.start:
+                    raise ConnectionError('connection closed in the middle of a reply')
+                return None
+            self.end += n
+
+    def _make_room(self):
+        # move the partial frame to the front, and grow the buffer if it fills most of it
+        size = self.end - self.start
+        if size > len(self.buffer) // 2:
+            buffer = bytearray(2 * len(self.buffer))
+            buffer[:size] = self.view[self.start:self.end]
+            (self.buffer, self.view) = (buffer, memoryview(buffer))
+        else:
+            self.view[:size] = self.view[self.start:self.end]
+
+
+class Connection:
+    """One TCP connection to the server and the FrameReader of its replies."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = FrameReader(sock)
+        self.reused = False
+
+    def send(self, js):
+        self.sock.sendall('{}EOM'.format(js).encode('utf-8'))
+
+    def receive(self, parse=False):
+        """Wait for the next \\n terminated reply.
+
+        :param parse: return the reply parsed as JSON, without its prefix, instead of its text
+        :return: the reply, or None if the server closed the connection before sending any of it
+        """
+        frame = self.reader.read_frame()
+        if frame is None:
+            return None
+        if parse:
+            return json.loads(str(frame[REPLY_PREFIX:], 'utf-8'))
+        return str(frame, 'utf-8')
+
+    def close(self):
+        self.sock.close()
+
+
+class ConnectionManager:
+    """Sends EOM framed commands to the server over as few TCP handshakes as possible.
+
+    A connection is kept open after its reply and the next command is sent on it. If the server
+    keeps connections open, pipeline writes a whole series of commands on one connection before
+    reading their replies in order. If the server closed the connection instead, the command is sent
+    again on a new connection and from then on every command uses its own connection, taken from
+    a pool of up to pool_size connections whose handshakes are made together ahead of use.
+
+    Attributes:
+        keep_alive (bool): whether the server keeps connections open, None until known
+    """
+
+    def __init__(self, host=HOST, port=PORT, pool_size=4, timeout=None):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keep_alive = None
+        self._idle = []
+
+    def request(self, js, parse=False):
+        """Send one command and wait for its reply."""
+        return self.pipeline([js], parse)[0]
+
+    def pipeline(self, messages, parse=False):
+        """Send a series of commands and wait for their replies.
+
+        :param messages: the json strings of the commands
+        :param parse: return the replies parsed as JSON, without their prefix, instead of their text
+        :return: the replies, in the order of the commands
+        """
+        messages = list(messages)
+        replies = []
+        failures = 0
+        while len(replies) < len(messages):
+            rest = messages[len(replies):]
+            if self.keep_alive is False:
+                got = self._exchange_pool(rest[:self.pool_size], parse)
+            else:
+                conn = self._take()
+                # until the server is known to keep connections open, send one command at a time
+                sent = rest if self.keep_alive else rest[:1]
+                got = self._exchange(conn, sent, parse)
+                if len(got) == len(sent):
+                    if conn.reused:
+                        self.keep_alive = True
+                    conn.reused = True
+                    self._idle.append(conn)
+                else:
+                    conn.close()
+                    if conn.reused and not got and self.keep_alive is None:
+                        self.keep_alive = False
+            failures = 0 if got else failures + 1
+            if failures > 2:
+                raise ConnectionError('the server closed the connection without a reply')
+            replies += got
+        return replies
+
+    def close(self):
+        for conn in self._idle:
+            conn.close()
+        self._idle = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _exchange(self, conn, messages, parse):
+        # the replies received before the server closed the connection
+        replies = []
+        try:
+            for js in messages:
+                conn.send(js)
+            for _ in messages:
+                reply = conn.receive(parse)
+                if reply is None:
+                    break
+                replies.append(reply)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        return replies
+
+    def _exchange_pool(self, messages, parse):
+        # one command per connection, all of them sent before any reply is read
+        batch = [self._take() for _ in messages]
+        sent = []
+        for (conn, js) in zip(batch, messages):
+            try:
+                conn.send(js)
+                sent.append(True)
+            except (BrokenPipeError, ConnectionResetError):
+                sent.append(False)
+        replies = []
+        complete = True
+        for (conn, ok) in zip(batch, sent):
+            complete = complete and ok
+            if complete:
+                try:
+                    reply = conn.receive(parse)
+                except (BrokenPipeError, ConnectionResetError):
+                    reply = None
+                complete = reply is not None
+                if complete:
+                    replies.append(reply)
+            conn.close()
+        return replies
+
+    def _take(self):
+        if not self._idle:
+            count = self.pool_size if self.keep_alive is False else 1
+            self._idle = [Connection(s) for s in self._connect(count)]
+        return self._idle.pop()
+
+    def _connect(self, count):
+        # start every handshake before waiting for any of them
+        socks = []
+        for _ in range(count):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setblocking(False)
+            s.connect_ex((self.host, self.port))
+            socks.append(s)
+        pending = list(socks)
+        while pending:
+            (_, writable, _) = select.select([], pending, [], self.timeout)
+            if not writable:
+                for s in socks:
+                    s.close()
+                raise socket.timeout('connect timed out')
+            for s in writable:
+                error = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error:
+                    for t in socks:
+                        t.close()
+                    raise ConnectionError(error, 'connect failed')
+                pending.remove(s)
+        for s in socks:
+            s.settimeout(self.timeout)
+        return socks
+
+
+_manager = ConnectionManager(timeout=REQUEST_TIMEOUT)
+
 
 def send_to_server(js):
-    """Open socket and send the json string js to server with EOM appended, and wait
-    for \n terminated reply.
+    """Send the json string js to server with EOM appended, and wait for the \\n terminated reply.
     js - json object to send to server
     """
-    clientsocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    clientsocket.connect(('128.250.106.25', 5002))
-    clientsocket.send("""{}EOM""".format(js).encode('utf-8'))
-    data = ''
-    while data == '' or data[-1] != "\n":
-        data += clientsocket.recv(1024).decode('utf-8')
-    print(data)
-    clientsocket.close()
\ No newline at end of file
+    print(_manager.request(js))
+
+
+def send_all_to_server(messages):
+    """Send a series of json strings to server, pipelined on one connection when the server allows it,
+    and print the replies in order.
+    """
+    for reply in _manager.pipeline(messages):
+        print(reply)
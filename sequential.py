@@ -0,0 +1,77 @@
+import math
+
+# two sided 95% normal quantile
+Z_95 = 1.959963984540054
+
+
+def wilson_interval(successes, games, z=Z_95):
+    """
+    :param successes: number of games with the outcome
+    :param games: number of games
+    :param z: normal quantile of the confidence level
+    :return: (low, high) Wilson score interval of the rate of the outcome
+    """
+    if games == 0:
+        return (0.0, 1.0)
+    p = successes / games
+    denominator = 1 + z * z / games
+    centre = (p + z * z / (2 * games)) / denominator
+    half = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denominator
+    return (max(0.0, centre - half), min(1.0, centre + half))
+
+
+def ci_resolved(counts, precision, z=Z_95):
+    """Whether the win, draw and loss rates of a cell are each known to within +-precision.
+
+    :param counts: [wins, draws, losses] of the cell
+    :param precision: largest allowed half width of the Wilson interval of each rate
+    """
+    games = sum(counts)
+    for k in counts:
+        (low, high) = wilson_interval(k, games, z)
+        if (high - low) / 2 > precision:
+            return False
+    return True
+
+
+def sprt_llr(counts, p0, p1):
+    """Log likelihood ratio of a Bernoulli SPRT on the score of the first player in a cell.
+
+    A win scores 1, a draw 1/2 and a loss 0, and H0 is that the first player scores p0 per game on
+    average, H1 that it scores p1.
+
+    :param counts: [wins, draws, losses] of the cell
+    """
+    (score, against) = (counts[0] + counts[1] / 2, counts[2] + counts[1] / 2)
+    return score * math.log(p1 / p0) + against * math.log((1 - p1) / (1 - p0))
+
+
+def sprt_resolved(counts, delta, alpha=0.05, beta=0.05):
+    """Whether the SPRTs of sprt_llr have decided how the first player's score compares with 0.5.
+
+    Two one sided tests run side by side, 0.5 against 0.5+delta and 0.5 against 0.5-delta, and the
+    cell is resolved once both have accepted a hypothesis. Players of equal strength, such as a cell
+    whose games are all draws, are accepted as equal by both, where a single test of 0.5-delta
+    against 0.5+delta would wait for decisive games that never come.
+
+    :param counts: [wins, draws, losses] of the cell
+    :param delta: the score rate difference from 0.5 that the tests detect
+    :param alpha: probability of accepting H1 when H0 holds, in each test
+    :param beta: probability of accepting H0 when H1 holds, in each test
+    """
+    (lower, upper) = (math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha))
+    return all(not lower < sprt_llr(counts, 0.5, 0.5 + d) < upper for d in (delta, -delta))
+
+
+def cell_resolved(counts, precision=None, sprt=None):
+    """Whether sampling of a cell can stop: any of the requested stopping rules holds.
+
+    :param counts: [wins, draws, losses] of the cell
+    :param precision: see ci_resolved, or None
+    :param sprt: delta of sprt_resolved, or None
+    """
+    if precision is not None and ci_resolved(counts, precision):
+        return True
+    if sprt is not None and sprt_resolved(counts, sprt):
+        return True
+    return False
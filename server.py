@@ -0,0 +1,279 @@
+from batch_engine import BatchEngine
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from referee import VICTORIES_CONDITIONS, COLUMN_NAMES
+from sandbox import SandboxPool
+from send_utility import source_hash
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import threading
+
+RESULTS = ('draw', 'player 1 won', 'player 2 won')
+# the largest command readuntil accepts, a TEST carries the source of two players
+REQUEST_LIMIT = 1 << 26
+
+
+class ProtocolError(Exception):
+    """A command the server cannot serve; its message is sent back to the client."""
+
+
+class MissingSource(ProtocolError):
+    """A command referenced a source hash the server does not hold."""
+
+
+def encode_reply(reply):
+    """
+    :param reply: the JSON serializable reply
+    :return: the reply as sent: its length in 8 digits, the JSON and a \\n terminator
+    """
+    text = json.dumps(reply)
+    return '{:08d}{}\n'.format(len(text), text).encode('utf-8')
+
+
+class GameServer:
+    """A local stand-in for the game server, speaking the same ADD/DEL/TEST protocol.
+
+    A command is a JSON object terminated by EOM, with cmd, syn, name, data and, for TEST, data2,
+    vt1 and vt2. The reply is an 8 character prefix, JSON and \\n. A connection stays open for
+    further commands until the client closes it, and its replies come back in command order, so
+    pipelining clients are served too.
+
+    ADD stores the player source data under name, replacing a player of the same name, and DEL
+    removes it. TEST plays one game between the sources data (moving first, with vt1) and data2
+    (with vt2) on two random distinct columns, and replies
+    [["syn", syn], ["p1", vt1, column1], ["p2", vt2, column2], matrix, result, "finished"], with the
+    matrix as a dict of column -> values and the result one of RESULTS.
+
+    REG stores the source data under its hash, the sha256 hex digest of its UTF-8 encoding, and
+    replies [["syn", syn], ["REG", hash], "finished"]. ADD and TEST may then give hash (and hash2)
+    in place of data (and data2). A hash the server does not hold, because it never saw the source
+    or dropped it, is answered [["syn", syn], ["missing", hash], "missing"] and the client sends the
+    source again. Inline sources are stored under their hash as well. The server holds the
+    max_sources most recently used sources.
+
+    BATCH carries one pairing, data (or hash) and data2 (or hash2), and a list cells of
+    [vt1, vt2, seat] with vt1 the condition of data and vt2 that of data2; data moves first in seat
+    0 and data2 in seat 1. The cells are played in parallel and each is answered as it finishes,
+    with the TEST reply of its game whose first entry is ["syn", syn, index of the cell]. A last
+    reply [["syn", syn], ["BATCH", number of cells], "finished"] closes the batch.
+
+    Connections are served on an asyncio event loop; games run on a pool of threads, each driving
+    its own SandboxPool worker, so the player code sent by clients runs under the sandbox limits
+    and a slow game does not hold up other clients.
+
+    Attributes:
+        registry (dict): name -> source of the players added
+    """
+
+    def __init__(self, registry_path=None, game_threads=None, sandbox_options=None, max_sources=1024):
+        """
+        :param registry_path: the JSON file the registry is kept in, loaded if it exists
+        :param game_threads: number of games played at once, defaults to the number of cores
+        :param sandbox_options: keyword arguments of the SandboxPool of each game thread
+        :param max_sources: the number of sources kept for REG and hash references
+        """
+        self.registry_path = registry_path
+        self.registry = {}
+        if registry_path is not None and os.path.exists(registry_path):
+            with open(registry_path, 'r') as f:
+                self.registry = json.load(f)
+        self.max_sources = max_sources
+        self.sources = OrderedDict()
+        self.sandbox_options = dict(sandbox_options or {})
+        self.executor = ThreadPoolExecutor(game_threads or os.cpu_count())
+        self._local = threading.local()
+        self._sandboxes = []
+        self._seeds = itertools.count(random.randrange(1 << 31))
+
+    async def serve(self, host='127.0.0.1', port=5002):
+        server = await asyncio.start_server(self.handle, host, port, limit=REQUEST_LIMIT)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        """Serve the commands of one connection until the client closes it."""
+        try:
+            while True:
+                try:
+                    data = await reader.readuntil(b'EOM')
+                except asyncio.IncompleteReadError:
+                    return
+                async for reply in self.replies(data[:-3]):
+                    writer.write(encode_reply(reply))
+                    await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def replies(self, data):
+        """
+        :param data: the JSON of one command, without EOM
+        :return: an async iterator over the replies of the command: one, or for BATCH one per cell in
+                 the order the cells finish and a last one closing the batch
+        """
+        try:
+            message = json.loads(data.decode('utf-8'))
+            cmd = message['cmd']
+        except (ValueError, AttributeError, KeyError, TypeError):
+            yield [['syn', None], ['error', 'malformed command'], 'error']
+            return
+        if cmd != 'BATCH':
+            yield await self.command(message)
+            return
+        syn = message.get('syn')
+        try:
+            (source1, source2) = (self.source(message, 'data', 'hash'), self.source(message, 'data2', 'hash2'))
+            cells = [(vt1, vt2, int(seat)) for (vt1, vt2, seat) in message['cells']]
+        except MissingSource as e:
+            yield [['syn', syn], ['missing', str(e)], 'missing']
+            return
+        except (KeyError, TypeError, ValueError):
+            yield [['syn', syn], ['error', 'malformed batch'], 'error']
+            return
+        games = [self._batch_cell(syn, i, source1, source2, cell) for (i, cell) in enumerate(cells)]
+        for game in asyncio.as_completed(games):
+            yield await game
+        yield [['syn', syn], ['BATCH', len(cells)], 'finished']
+
+    async def command(self, message):
+        """
+        :param message: one command other than BATCH, parsed
+        :return: the reply
+        """
+        syn = message.get('syn')
+        cmd = message['cmd']
+        try:
+            if cmd == 'REG':
+                return [['syn', syn], ['REG', self.register(message['data'], message.get('hash'))], 'finished']
+            if cmd == 'ADD':
+                source = self.source(message, 'data', 'hash')
+                return [['syn', syn], ['ADD', self.add(message['name'], source)], 'finished']
+            if cmd == 'DEL':
+                return [['syn', syn], ['DEL', self.delete(message['name'])], 'finished']
+            if cmd == 'TEST':
+                loop = asyncio.get_running_loop()
+                (source1, source2) = (self.source(message, 'data', 'hash'), self.source(message, 'data2', 'hash2'))
+                game = await loop.run_in_executor(self.executor, self.test, source1, source2,
+                                                  message['vt1'], message['vt2'])
+                return [['syn', syn]] + game + ['finished']
+            raise ProtocolError('unknown command {!r}'.format(cmd))
+        except MissingSource as e:
+            return [['syn', syn], ['missing', str(e)], 'missing']
+        except KeyError as e:
+            return [['syn', syn], ['error', 'missing field {}'.format(e)], 'error']
+        except ProtocolError as e:
+            return [['syn', syn], ['error', str(e)], 'error']
+
+    async def _batch_cell(self, syn, index, source1, source2, cell):
+        (vt1, vt2, seat) = cell
+        loop = asyncio.get_running_loop()
+        try:
+            if seat == 0:
+                game = await loop.run_in_executor(self.executor, self.test, source1, source2, vt1, vt2)
+            else:
+                game = await loop.run_in_executor(self.executor, self.test, source2, source1, vt2, vt1)
+        except ProtocolError as e:
+            return [['syn', syn, index], ['error', str(e)], 'error']
+        return [['syn', syn, index]] + game + ['finished']
+
+    def register(self, source, key=None):
+        """Store a source under its hash.
+
+        :param key: the hash the client computed, checked against the source
+        :return: the hash
+        """
+        if not isinstance(source, str):
+            raise ProtocolError('source is not a string')
+        actual = source_hash(source)
+        if key is not None and key != actual:
+            raise ProtocolError('hash does not match the source')
+        self.sources[actual] = source
+        self.sources.move_to_end(actual)
+        while len(self.sources) > self.max_sources:
+            self.sources.popitem(last=False)
+        return actual
+
+    def source(self, message, field, hash_field):
+        """
+        :return: the source a command gives inline in field, or references by hash in hash_field
+        """
+        if field in message:
+            source = message[field]
+            self.register(source)
+            return source
+        key = message[hash_field]
+        if key not in self.sources:
+            raise MissingSource(key)
+        self.sources.move_to_end(key)
+        return self.sources[key]
+
+    def add(self, name, source):
+        replaced = name in self.registry
+        self.registry[name] = source
+        self._save_registry()
+        return 'replaced' if replaced else 'added'
+
+    def delete(self, name):
+        if self.registry.pop(name, None) is None:
+            return 'not found'
+        self._save_registry()
+        return 'deleted'
+
+    def test(self, source1, source2, vt1, vt2, seed=None):
+        """Play one game between two player sources in the sandbox of the calling thread.
+
+        :return: [["p1", vt1, column1], ["p2", vt2, column2], matrix, result]
+        """
+        for vt in (vt1, vt2):
+            if vt not in VICTORIES_CONDITIONS:
+                raise ProtocolError('unknown victory condition {!r}'.format(vt))
+        seed = next(self._seeds) if seed is None else seed
+        (column1, column2) = random.Random(seed).sample(COLUMN_NAMES, 2)
+        sandbox = self._sandbox()
+        engine = BatchEngine(sandbox.player_class(source1, 'player1'), sandbox.player_class(source2, 'player2'),
+                             [((vt1, column1), (vt2, column2))], seeds=[seed])
+        result = engine.play()[0]
+        return [['p1', vt1, column1], ['p2', vt2, column2], engine.game_state(0), RESULTS[result]]
+
+    def close(self):
+        self.executor.shutdown()
+        for sandbox in self._sandboxes:
+            sandbox.close()
+
+    def _sandbox(self):
+        if not hasattr(self._local, 'sandbox'):
+            self._local.sandbox = SandboxPool(**self.sandbox_options)
+            self._sandboxes.append(self._local.sandbox)
+        return self._local.sandbox
+
+    def _save_registry(self):
+        if self.registry_path is None:
+            return
+        tmp = self.registry_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.registry, f)
+        os.replace(tmp, self.registry_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local game server speaking the ADD/DEL/TEST protocol.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--registry', help='JSON file the added players are kept in')
+    parser.add_argument('--game-threads', type=int, help='games played at once')
+    parser.add_argument('--max-sources', type=int, default=1024, help='sources kept for hash references')
+    args = parser.parse_args()
+
+    server = GameServer(args.registry, args.game_threads, max_sources=args.max_sources)
+    print('Serving on {}:{}'.format(args.host, args.port))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
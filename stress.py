@@ -0,0 +1,108 @@
+from batch_engine import BatchEngine
+from referee import VICTORIES_CONDITIONS, make_column_names
+from tournament import PLAYER_MODULES
+import argparse
+import importlib
+import numpy as np
+import random
+import time
+import warnings
+
+
+def timed_player_class(player_cls, latencies):
+    """Wrap a Player class so that the duration of each take_turn call is recorded.
+
+    :param player_cls: the Player class of a player module
+    :param latencies: list that receives the duration in seconds of every take_turn call
+    :return: a subclass of player_cls
+    """
+    class TimedPlayer(player_cls):
+        def take_turn(self, data, victory):
+            start = time.perf_counter()
+            try:
+                return super().take_turn(data, victory)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    return TimedPlayer
+
+
+def stress_player(player_cls, opponent_cls, num_of_columns, num_of_turns, conditions=VICTORIES_CONDITIONS,
+                  budget=60.0):
+    """Play one game per victory condition on a large board and time every take_turn of a player.
+
+    The games are played turn by turn until the last turn or until the player has used up the time
+    budget, so that players which slow down quadratically still report where they stand.
+
+    :param player_cls: Player class under test
+    :param opponent_cls: Player class of the opponent, preferably a cheap one
+    :param num_of_columns: number of columns of the board
+    :param num_of_turns: number of turns of a game
+    :param conditions: victory conditions of the player under test, one game each
+    :param budget: time budget in seconds of the player under test
+    :return: (latencies, errors) where latencies is a float array of shape (turns played, games)
+             with the duration of each take_turn call, and errors a list of the exceptions raised
+    """
+    column_names = make_column_names(num_of_columns)
+    victories = []
+    for c in conditions:
+        (column1, column2) = random.sample(column_names, 2)
+        victories.append(((c, column1), (random.choice(VICTORIES_CONDITIONS), column2)))
+
+    calls = []
+    engine = BatchEngine(timed_player_class(player_cls, calls), opponent_cls, victories, num_of_turns=num_of_turns,
+                         column_names=column_names)
+    latencies = []
+    spent = 0.0
+    while engine.length < engine.board.shape[2] and spent < budget:
+        del calls[:]
+        engine.step()
+        if len(calls) < len(victories):
+            # a player that raised is not called again, so the rows would no longer line up
+            break
+        latencies.append(list(calls))
+        spent += sum(calls)
+    return (np.array(latencies).reshape(-1, len(victories)), [engine.errors[k] for k in sorted(engine.errors)])
+
+
+def latency_growth(latencies):
+    """Summarise how the per-turn latency of a player grows with the length of the game.
+
+    :param latencies: float array of shape (turns, games) of take_turn durations
+    :return: (first, last, exponent): the median latency over the first and the last tenth of the
+             turns, and the slope of log(latency) against log(turn) over the second half of the turns.
+             An exponent around 0 means constant time per turn, around 1 a full scan of the board
+             per turn (quadratic over the game).
+    """
+    per_turn = np.median(latencies, axis=1)
+    n = len(per_turn)
+    if n < 4:
+        return (per_turn[0] if n else np.nan, per_turn[-1] if n else np.nan, np.nan)
+    tenth = max(1, n // 10)
+    turns = np.arange(1, n + 1)
+    half = slice(n // 2, n)
+    exponent = np.polyfit(np.log(turns[half]), np.log(np.maximum(per_turn[half], 1e-9)), 1)[0]
+    return (np.median(per_turn[:tenth]), np.median(per_turn[-tenth:]), exponent)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure how take_turn latency grows on large boards.')
+    parser.add_argument('modules', nargs='*', default=PLAYER_MODULES, help='player module names')
+    parser.add_argument('--columns', type=int, default=200)
+    parser.add_argument('--turns', type=int, default=5000)
+    parser.add_argument('--conditions', nargs='+', default=VICTORIES_CONDITIONS)
+    parser.add_argument('--opponent', default='player_minimal')
+    parser.add_argument('--budget', type=float, default=60.0, help='seconds of take_turn time per module')
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    opponent = importlib.import_module(args.opponent).Player
+    print('{} columns x {} turns'.format(args.columns, args.turns))
+    print('module\tturns\tfirst (ms)\tlast (ms)\texponent\terrors')
+    for m in args.modules:
+        m = m[:-3] if m.endswith('.py') else m
+        (latencies, errors) = stress_player(importlib.import_module(m).Player, opponent, args.columns, args.turns,
+                                            conditions=args.conditions, budget=args.budget)
+        (first, last, exponent) = latency_growth(latencies)
+        print('{}\t{}\t{:.3f}\t{:.3f}\t{:.2f}\t{}'.format(m, len(latencies), first * 1000, last * 1000, exponent,
+                                                         '; '.join(set(repr(e) for e in errors))))
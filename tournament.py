@@ -0,0 +1,238 @@
+from batch_engine import BatchEngine
+from collections import defaultdict as dd
+from itertools import combinations, permutations
+from multiprocessing import Pool
+from ratings import RatingLadder
+from referee import VICTORIES_CONDITIONS, COLUMN_NAMES
+from replay import append_replays
+from result_store import ResultStore
+from sandbox import SandboxPool
+from sequential import cell_resolved
+import argparse
+import importlib
+import importlib.util
+import numpy as np
+import os
+import time
+import warnings
+
+PLAYER_MODULES = ['assign_stupid2_bkp', 'player', 'player_minimal', 'player_n10m', 'player_new',
+                  'player_new_e', 'player_new_one', 'player_new_one_d', 'player_new_one_drd',
+                  'player_new_two', 'player_one_early']
+
+# the player classes of the worker process, loaded once by init_worker
+_players = {}
+_sandbox = []
+
+
+def read_sources(modules):
+    """
+    :param modules: names of the player modules
+    :return: dict of module -> its source code, found on the import path as import_module would find it
+    """
+    sources = {}
+    for m in modules:
+        spec = importlib.util.find_spec(m)
+        if spec is None or spec.origin is None:
+            raise ModuleNotFoundError('no player module named {!r}'.format(m))
+        with open(spec.origin, 'r') as f:
+            sources[m] = f.read()
+    return sources
+
+
+def init_worker(modules, sources=None):
+    """Pool initializer: import every player module once so that workers stay warm.
+
+    :param modules: names of the player modules
+    :param sources: dict of module -> source, see read_sources, to run the players in a SandboxPool
+                    process of this worker instead of importing them
+    """
+    warnings.simplefilter('ignore')
+    if sources is not None and not _sandbox:
+        _sandbox.append(SandboxPool())
+    for m in modules:
+        if _sandbox:
+            _players[m] = _sandbox[0].player_class(sources[m], m)
+        else:
+            _players[m] = importlib.import_module(m).Player
+    # forked workers inherit the same global random state, so the players would play alike
+    np.random.seed()
+
+
+def play_chunk(task):
+    """Play one chunk of games between two players in a batch engine.
+
+    :param task: (module1, module2, victories, seeds, keep_boards) where victories is a list of
+                 ((condition1, column1), (condition2, column2)) for module1 moving first
+    :return: (module1, module2, victories, seeds, results, boards) with the results as in
+             BatchEngine.score, and the game matrices if keep_boards else None
+    """
+    (module1, module2, victories, seeds, keep_boards) = task
+    if module1 not in _players or module2 not in _players:
+        init_worker([module1, module2])
+    engine = BatchEngine(_players[module1], _players[module2], victories, seeds=seeds)
+    results = engine.play()
+    return (module1, module2, victories, seeds, results, engine.board if keep_boards else None)
+
+
+def tournament_tasks(modules, conditions1=VICTORIES_CONDITIONS, conditions2=VICTORIES_CONDITIONS,
+                     column_names=COLUMN_NAMES, repeat=1, chunk_size=500, self_play=False, seed=0,
+                     keep_boards=False, cells=None, focus=None):
+    """Enumerate the games of a round robin as chunks of work for play_chunk.
+
+    Every pairing plays every (condition1, condition2) pair on every ordered pair of distinct
+    columns, in both seat orders.
+
+    :param modules: names of the player modules
+    :param conditions1: victory conditions of the first player of a pairing
+    :param conditions2: victory conditions of the second player of a pairing
+    :param column_names: the column names of the board
+    :param repeat: number of games for each (pairing, conditions, columns, seat)
+    :param chunk_size: maximum number of games in a chunk
+    :param self_play: also pair each module with itself
+    :param seed: the seed of the first game, the following games are seeded seed+1, seed+2, ...
+    :param keep_boards: have play_chunk return the game matrices
+    :param cells: only play these (module1, module2, vt1, vt2) cells of the result table, with module1
+                  before module2 in modules, instead of every condition pair of every pairing
+    :param focus: only play the pairings of this module
+    :return: a list of (module1, module2, victories, seeds, keep_boards) tasks
+    """
+    pairings = list(combinations(modules, 2))
+    if self_play:
+        pairings += [(m, m) for m in modules]
+    if focus is not None:
+        pairings = [p for p in pairings if focus in p]
+
+    tasks = []
+    for (a, b) in pairings:
+        if cells is None:
+            condition_pairs = [(vt1, vt2) for vt1 in conditions1 for vt2 in conditions2]
+        else:
+            condition_pairs = [(vt1, vt2) for (m1, m2, vt1, vt2) in cells if (m1, m2) == (a, b)]
+        for (first, second, swap) in ((a, b, False), (b, a, True)):
+            victories = []
+            for (vt1, vt2) in condition_pairs:
+                for (col1, col2) in permutations(column_names, 2):
+                    if swap:
+                        victories += [((vt2, col2), (vt1, col1))] * repeat
+                    else:
+                        victories += [((vt1, col1), (vt2, col2))] * repeat
+            for i in range(0, len(victories), chunk_size):
+                chunk = victories[i:i+chunk_size]
+                tasks.append((first, second, chunk, list(range(seed, seed + len(chunk))), keep_boards))
+                seed += len(chunk)
+    return tasks
+
+
+def run_tournament(modules, processes=None, sandbox=False, replay_log=None, store=None, ratings=None,
+                   precision=None, sprt=None, max_rounds=50, seed=0, **kwargs):
+    """Play a round robin tournament between player modules on a pool of worker processes.
+
+    With precision or sprt the tournament is played in rounds of repeat games per columns and seat,
+    and after each round only the cells (pairing, condition pair) that no stopping rule has resolved
+    yet are played again, see sequential.cell_resolved. Lopsided cells stop after a round or two
+    while close ones keep sampling up to max_rounds.
+
+    :param modules: names of the player modules
+    :param processes: number of worker processes, defaults to the number of cores
+    :param sandbox: run the player code in sandbox processes, so that a hanging player forfeits its game
+    :param replay_log: append every game to this replay log, see replay.py
+    :param store: append every game to the ResultStore in this directory
+    :param ratings: rate every game on the RatingLadder saved in this JSON file; with focus only the
+                    focus module is rated
+    :param precision: stop a cell once its win, draw and loss rates have 95% confidence intervals of
+                      at most +-precision
+    :param sprt: stop a cell once SPRTs of its score rate, with draws as half a win, tell whether it is
+                 0.5, 0.5+sprt or 0.5-sprt, see sequential.sprt_resolved
+    :param max_rounds: the largest number of rounds of a sequential tournament
+    :param seed: the seed of the first game
+    :param kwargs: passed to tournament_tasks
+    :return: result_table[(module1, module2)][(vt1, vt2)] = [module1 wins, draws, module2 wins],
+             with module1 before module2 in modules and vt1 the condition of module1
+    """
+    result_table = dd(lambda: dd(lambda: [0, 0, 0]))
+    order = {m: i for (i, m) in enumerate(modules)}
+    result_store = ResultStore(store) if store is not None else None
+    ladder = RatingLadder(ratings) if ratings is not None else None
+    if ladder is not None and kwargs.get('focus') is not None:
+        ladder.fixed = set(modules) - {kwargs['focus']}
+    sequential = precision is not None or sprt is not None
+    cells = None
+    # the sources are read here, so that a missing module fails before any worker starts
+    sources = read_sources(modules) if sandbox else None
+    with Pool(processes, initializer=init_worker, initargs=(modules, sources)) as pool:
+        for _ in range(max_rounds if sequential else 1):
+            tasks = tournament_tasks(modules, keep_boards=replay_log is not None or store is not None, seed=seed,
+                                     cells=cells, **kwargs)
+            if not tasks:
+                break
+            seed += sum(len(task[2]) for task in tasks)
+            # in task order, so that the ratings, which depend on the order of the games, are the same every run
+            for (first, second, victories, seeds, results, boards) in pool.imap(play_chunk, tasks):
+                if replay_log is not None:
+                    append_replays(replay_log, (first, second), victories, seeds, boards, COLUMN_NAMES)
+                if result_store is not None:
+                    result_store.append((first, second), victories, seeds, results, boards)
+                if ladder is not None:
+                    ladder.update((first, second), victories, results)
+                swap = order[first] > order[second]
+                pairing = (second, first) if swap else (first, second)
+                for ((v1, v2), res) in zip(victories, results):
+                    if swap:
+                        (v1, v2) = (v2, v1)
+                        res = (0, 2, 1)[res]
+                    counts = result_table[pairing][(v1[0], v2[0])]
+                    counts[(1, 0, 2).index(res)] += 1
+            cells = [(m1, m2, vt1, vt2) for ((m1, m2), table) in result_table.items()
+                     for ((vt1, vt2), counts) in table.items() if not cell_resolved(counts, precision, sprt)]
+    if ladder is not None:
+        ladder.save()
+    return result_table
+
+
+def print_result_table(result_table, detail=False):
+    """Print the wins, draws and losses of each pairing, and of each condition pair if detail."""
+    for ((m1, m2), cells) in sorted(result_table.items()):
+        total = np.sum(list(cells.values()), axis=0)
+        print('{} vs {}\t{} won: {}\tdraw: {}\t{} won: {}'.format(m1, m2, m1, total[0], total[1], m2, total[2]))
+        if detail:
+            for ((vt1, vt2), counts) in sorted(cells.items()):
+                print('\t{},{}\t{}\t{}\t{}'.format(vt1, vt2, *counts))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Round robin tournament between player modules.')
+    parser.add_argument('modules', nargs='*', default=PLAYER_MODULES, help='player module names')
+    parser.add_argument('--conditions1', nargs='+', default=VICTORIES_CONDITIONS)
+    parser.add_argument('--conditions2', nargs='+', default=VICTORIES_CONDITIONS)
+    parser.add_argument('--repeat', type=int, default=1, help='games per conditions, columns and seat (per round)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--self-play', action='store_true')
+    parser.add_argument('--detail', action='store_true', help='print the result of each condition pair')
+    parser.add_argument('--sandbox', action='store_true', help='run the players in sandboxed worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--replay-log', help='append every game to this replay log')
+    parser.add_argument('--store', help='append every game to the result store in this directory')
+    parser.add_argument('--ratings', help='rate every game on the rating ladder in this JSON file')
+    parser.add_argument('--place', metavar='MODULE',
+                        help='only play the pairings of MODULE, to place it on an existing ladder')
+    parser.add_argument('--precision', type=float,
+                        help='stop sampling a cell once its win/draw/loss rates are known to +-PRECISION')
+    parser.add_argument('--sprt', type=float, metavar='DELTA',
+                        help='stop sampling a cell once SPRTs of score rate 0.5 vs 0.5+-DELTA decide')
+    parser.add_argument('--max-rounds', type=int, default=50, help='rounds of a sequential tournament')
+    args = parser.parse_args()
+
+    modules = [m[:-3] if m.endswith('.py') else m for m in args.modules]
+    start = time.time()
+    table = run_tournament(modules, processes=args.processes, sandbox=args.sandbox, replay_log=args.replay_log,
+                           store=args.store, ratings=args.ratings, focus=args.place, precision=args.precision, sprt=args.sprt,
+                           max_rounds=args.max_rounds, conditions1=args.conditions1, conditions2=args.conditions2,
+                           repeat=args.repeat, chunk_size=args.chunk_size, self_play=args.self_play, seed=args.seed)
+    print_result_table(table, detail=args.detail)
+    print('{} games'.format(sum(sum(counts) for cells in table.values() for counts in cells.values())))
+    if args.ratings is not None:
+        for (module, rating, games) in RatingLadder(args.ratings).ladder():
+            print('{}\t{:.0f}\t{}'.format(module, rating, games))
+    print('Tournament finished in {:.1f}s'.format(time.time() - start))
@@ -0,0 +1,122 @@
+from referee import VICTORIES_CONDITIONS, pearson_pvalue, unique_extreme_wins
+import numpy as np
+
+
+class WinStateTracker:
+    """Running statistics of every column of a batch of games, kept up to date as rows are played.
+
+    Each appended value updates, in constant time:
+        - a compensated (Neumaier) running sum, for SumPos, SumNeg and ZeroM
+        - the running mean, sum of squared deviations and co-moment with the row index of the
+          values and of their squares (Welford's updates), for Linear and Quadratic
+        - the maximum and minimum of the column, for the unique Max and Min
+
+    so that check_win_states answers at any point of a game without looking at the board. The
+    verdicts are the same as referee.check_win_state's, apart from cases decided by the last bits
+    of a sum or a correlation coefficient.
+
+    Attributes:
+        n (int): number of rows appended so far
+        col_sum (np.ndarray): sum of each column, shape (games, columns)
+        col_max (np.ndarray): maximum of each column
+        col_min (np.ndarray): minimum of each column
+    """
+
+    def __init__(self, num_of_games, num_of_columns):
+        shape = (num_of_games, num_of_columns)
+        self.n = 0
+        self.col_sum = np.zeros(shape)
+        self._sum_err = np.zeros(shape)
+        self.col_max = np.full(shape, -np.inf)
+        self.col_min = np.full(shape, np.inf)
+        # mean, sum of squared deviations and co-moment with the row index, of x and of x*x
+        self._mean = np.zeros((2,) + shape)
+        self._m2 = np.zeros((2,) + shape)
+        self._co = np.zeros((2,) + shape)
+        self._first = np.zeros((2,) + shape)
+        self._const = np.ones((2,) + shape, dtype=bool)
+
+    def append(self, row):
+        """Add one row to every game.
+
+        :param row: float array of shape (games, columns), the values appended to each column
+        """
+        row = np.asarray(row, dtype=float)
+        i = self.n
+        self.n += 1
+
+        # Neumaier summation keeps the running sum as exact as a pairwise sum
+        total = self.col_sum + row
+        big = np.abs(self.col_sum) >= np.abs(row)
+        self._sum_err += np.where(big, (self.col_sum - total) + row, (row - total) + self.col_sum)
+        self.col_sum = total
+
+        np.maximum(self.col_max, row, out=self.col_max)
+        np.minimum(self.col_min, row, out=self.col_min)
+
+        values = np.stack((row, row * row))
+        if i == 0:
+            self._first[...] = values
+        else:
+            self._const &= values == self._first
+        delta = values - self._mean
+        self._mean += delta / self.n
+        self._m2 += delta * (values - self._mean)
+        self._co += delta * (i - (self.n - 1) / 2)
+
+    def extend(self, rows):
+        """Add several rows to every game.
+
+        :param rows: float array of shape (games, columns, rows)
+        """
+        for k in range(np.shape(rows)[2]):
+            self.append(rows[:, :, k])
+
+    def sums(self):
+        """
+        :return: the compensated sum of each column, shape (games, columns)
+        """
+        return self.col_sum + self._sum_err
+
+    def correlations(self):
+        """
+        :return: (r, p) arrays of shape (2, games, columns): the Pearson correlation of the values
+                 (index 0) and of their squares (index 1) with the row index, and its p-value
+        """
+        m2_index = self.n * (self.n * self.n - 1) / 12
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = np.clip(self._co / np.sqrt(self._m2 * m2_index), -1.0, 1.0)
+        r[self._const] = np.nan
+        return (r, pearson_pvalue(r, self.n))
+
+    def check_win_states(self, conditions, columns):
+        """Check the victory conditions of every game on the rows played so far.
+
+        :param conditions: the victory condition name of each game
+        :param columns: the index of the victory column of each game
+        :return: bool array of shape (games,), True where the condition is currently met
+        """
+        conditions = np.asarray(conditions)
+        columns = np.asarray(columns, dtype=int)
+        if (~np.isin(conditions, VICTORIES_CONDITIONS)).any():
+            raise SystemError
+        games = np.arange(len(columns))
+        wins = np.zeros(len(columns), dtype=bool)
+
+        for (v_condition, col_extreme) in (('Max', self.col_max), ('Min', self.col_min)):
+            idx = games[conditions == v_condition]
+            if idx.size:
+                wins[idx] = unique_extreme_wins(v_condition, col_extreme[idx], columns[idx])
+
+        (r, p) = self.correlations()
+        for (k, v_condition) in enumerate(('Linear', 'Quadratic')):
+            idx = games[conditions == v_condition]
+            with np.errstate(invalid='ignore'):
+                wins[idx] = (p[k, idx, columns[idx]] <= 0.05) & (r[k, idx, columns[idx]] >= 0.9)
+
+        col_sum = self.sums()[games, columns]
+        mean = col_sum / self.n
+        wins |= (conditions == 'ZeroM') & (-0.000001 < mean) & (mean < 0.000001)
+        wins |= (conditions == 'SumNeg') & (col_sum < 0)
+        wins |= (conditions == 'SumPos') & (col_sum > 0)
+        return wins